@@ -1 +1,15 @@
-from .bot import QQbot
\ No newline at end of file
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .bot import QQbot
+
+__all__ = ['QQbot']
+
+
+def __getattr__(name: str):
+    # import bot on first use, `import madoka.filter` etc. stay light
+    if name == 'QQbot':
+        from .bot import QQbot
+
+        return QQbot
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,42 @@
+"""
+compare building outgoing message by pydantic Text and by Chain
+
+python -m madoka.bench.chain [number]
+"""
+from __future__ import annotations
+
+import sys
+import timeit
+
+from ..typing import AtText, Chain, ImageText, PlainText
+
+
+def byText() -> list:
+    return [
+        text.dict() for text in [
+            PlainText('hello '),
+            AtText(type='At', target=123456, display=''),
+            PlainText(' world'),
+            ImageText(path='image/madoka.png'),
+        ]
+    ]
+
+
+def byChain() -> list:
+    return (Chain()
+            .text('hello ')
+            .at(123456)
+            .text(' world')
+            .image(path='image/madoka.png')
+            .build())
+
+
+def main(number: int = 20000) -> None:
+    assert byText() == byChain(), "Chain differ from Text.dict()"
+    for func in (byText, byChain):
+        cost = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{func.__name__:>8}: {cost / number * 1e6:8.2f} us/op")
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,125 @@
+"""
+end-to-end load test of QQbot against FakeMirai
+
+python -m madoka.bench.load --messages 20000 --handlers 10
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any, Optional
+
+from ..bot import QQbot
+from ..filter import isText
+from ..typing import Context, SourceText
+from .server import FakeMirai, recorded, synthetic
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+async def run(
+    messages: int = 10000,
+    handlers: int = 10,
+    rate: float = 0,
+    replyEvery: int = 10,
+    latency: float = 0.0,
+    record: Optional[str] = None,
+    port: int = 8765,
+) -> dict[str, Any]:
+    """
+    :handlers: number of handlers, the first one replies to `ping`
+    :replyEvery: reply to one of replyEvery `ping`, 0 to never reply
+    :latency: seconds fake mirai waits before answering a command
+    :record: JSONL file to replay instead of synthetic messages
+    """
+    handlerLatency: list[float] = []
+    sendRtt: list[float] = []
+    handled = 0
+    finish = asyncio.Event()
+
+    async with FakeMirai(port=port, latency=latency) as mirai:
+        bot = QQbot(1, mirai.host_port, 'bench')
+
+        def done(ctx: Context) -> None:
+            nonlocal handled
+            push = mirai.pushTime.get(ctx.getExist(SourceText).id)
+            if push is not None:
+                handlerLatency.append(time.perf_counter() - push)
+            handled += 1
+            if handled >= messages * handlers: finish.set()
+
+        async def reply(bot: QQbot, ctx: Context) -> None:
+            if replyEvery and ctx.messageId % replyEvery == 0:
+                start = time.perf_counter()
+                await bot.reply('pong')
+                sendRtt.append(time.perf_counter() - start)
+            done(ctx)
+
+        bot.addFunction()(reply)
+        for i in range(1, handlers):
+            check = isText(f'^never{i}$')
+
+            def handler(bot: QQbot, ctx: Context, check=check) -> None:
+                check(bot, ctx)
+                done(ctx)
+
+            handler.__name__ = f'handler{i}'
+            bot.addFunction()(handler)
+
+        async with bot:
+            await bot.start(block=False, schedule=False)
+            stream = recorded(record) if record else synthetic()
+            start = time.perf_counter()
+            await mirai.push(stream, number=messages, rate=rate)
+            try:
+                await asyncio.wait_for(finish.wait(), timeout=max(60, messages / 100))
+            except asyncio.TimeoutError:
+                pass
+            elapsed = time.perf_counter() - start
+            bot.stop()
+            await bot.wait()
+
+    return {
+        'messages': mirai.pushed,
+        'handled': handled,
+        'seconds': elapsed,
+        'msgPerSec': mirai.pushed / elapsed if elapsed else 0.0,
+        'latencyP50': percentile(handlerLatency, 50),
+        'latencyP99': percentile(handlerLatency, 99),
+        'sends': len(sendRtt),
+        'sendP50': percentile(sendRtt, 50),
+        'sendP99': percentile(sendRtt, 99),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--handlers', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=0)
+    parser.add_argument('--reply-every', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--record', default=None)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    ret = asyncio.run(
+        run(args.messages, args.handlers, args.rate, args.reply_every,
+            args.latency, args.record, args.port))
+    print(f"messages  : {ret['handled']}/{ret['messages'] * args.handlers} handled"
+          f" in {ret['seconds']:.2f}s, {ret['msgPerSec']:.0f} msg/s")
+    print(f"latency   : p50 {ret['latencyP50'] * 1e3:.2f}ms"
+          f"  p99 {ret['latencyP99'] * 1e3:.2f}ms")
+    print(f"send rtt  : p50 {ret['sendP50'] * 1e3:.2f}ms"
+          f"  p99 {ret['sendP99'] * 1e3:.2f}ms ({ret['sends']} sends)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+microbenchmarks of hot paths, compared with stored baseline
+
+python -m madoka.bench.micro              # run and compare with baseline
+python -m madoka.bench.micro --save       # run and store as baseline
+python -m madoka.bench.micro --tolerance 0.5 -k filter
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import Any, Callable, Optional
+
+from ..bot import QQbot
+from ..bot.api import ApiUnit
+from ..filter import inGroup, isAdmin, isAtSelf, isGroupMessage, isText
+from ..typing import Chain, Context, Event, ImageText, PlainText
+from .server import groupMessage
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+bot = QQbot(1, '127.0.0.1:0', 'bench', adminQid=12345)
+
+
+def groupPayload() -> dict[str, Any]:
+    data = groupMessage(1, 'ping', sender=12345, group=20000)
+    data['messageChain'][1:] = [
+        {'type': 'At', 'target': 1, 'display': '@madoka'},
+        {'type': 'Plain', 'text': ' 奇跡も、魔法も、あるんだよ ' * 4},
+        {'type': 'Image', 'imageId': '{01E9451B-70ED-EAE3-B37C-101F1EEBF5B5}.jpg',
+         'url': 'https://example.com/image.jpg', 'path': None, 'base64': None},
+        {'type': 'Face', 'faceId': 14, 'name': '微笑'},
+        {'type': 'Plain', 'text': 'ping'},
+    ]
+    return data
+
+
+def eventPayload() -> dict[str, Any]:
+    return {
+        'type': 'MemberCardChangeEvent',
+        'origin': 'before',
+        'current': 'after',
+        'member': groupPayload()['sender'],
+    }
+
+
+GROUP = groupPayload()
+EVENT = eventPayload()
+CTX = Context.parse_obj(GROUP)
+CENSOR = (isAdmin | ~isGroupMessage) & isText('^ping$') | isAtSelf & inGroup([20000, 20001])
+MESSAGE = [PlainText('hello '), ImageText(path='image/madoka.png'), PlainText(' world')]
+LINES = [f'line {i}: ' + 'madoka ' * 10 for i in range(50)]
+
+cases: dict[str, Callable[[], Any]] = {
+    'parse.context': lambda: Context.parse_obj(GROUP),
+    'parse.event': lambda: Event.parse_obj(EVENT),
+    'context.text': lambda: CTX.text,
+    'filter.isText': lambda: isText('ping$')(bot, CTX),
+    'filter.isAtSelf': lambda: isAtSelf(bot, CTX),
+    'filter.inGroup': lambda: inGroup([20000, 20001])(bot, CTX),
+    'filter.tree': lambda: CENSOR(bot, CTX),
+    'format.str': lambda: ApiUnit._formatMessage('hello world'),
+    'format.text': lambda: ApiUnit._formatMessage(MESSAGE),
+    'format.chain': lambda: ApiUnit._formatMessage(
+        Chain().text('hello ').image(path='image/madoka.png').text(' world')),
+    'pack': lambda: bot.pack(LINES),
+}
+
+
+def measure(func: Callable[[], Any], budget: float = 0.2, repeat: int = 5) -> float:
+    """
+    :return: best seconds per call
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * budget / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def load(path: str) -> dict[str, float]:
+    try:
+        with open(path, 'r') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return {}
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help="store result as baseline")
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help="fail if slower than baseline by this ratio")
+    parser.add_argument('-k', default='', help="only run cases containing this")
+    args = parser.parse_args(argv)
+
+    baseline = load(args.baseline)
+    result: dict[str, float] = {}
+    slower: list[str] = []
+    for name, func in cases.items():
+        if args.k not in name: continue
+        cost = result[name] = measure(func)
+        base = baseline.get(name)
+        if base:
+            ratio = cost / base - 1
+            mark = ' SLOWER' if ratio > args.tolerance else ''
+            if mark: slower.append(name)
+            print(f"{name:<16} {cost * 1e6:10.2f} us  {ratio:+7.1%}{mark}")
+        else:
+            print(f"{name:<16} {cost * 1e6:10.2f} us")
+
+    if args.save:
+        baseline.update(result)
+        with open(args.baseline, 'w') as fp:
+            json.dump(baseline, fp, indent=4, sort_keys=True)
+        print(f"baseline saved: {args.baseline}")
+        return 0
+    if slower:
+        print(f"slower than baseline by {args.tolerance:.0%}: {', '.join(slower)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
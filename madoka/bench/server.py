@@ -0,0 +1,202 @@
+"""
+a local stand-in of mirai-api-http websocket adapter
+enough for `QQbot` to connect, send commands and receive messages
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from itertools import count
+from typing import Any, Iterable, Iterator, Optional
+from urllib.parse import parse_qs, urlparse
+
+from websockets.legacy import server
+from websockets.legacy.protocol import WebSocketCommonProtocol
+
+logger = logging.getLogger(__name__)
+
+
+def friendMessage(messageId: int, text: str, sender: int = 10000) -> dict[str, Any]:
+    return {
+        'type': 'FriendMessage',
+        'messageChain': [
+            {'type': 'Source', 'id': messageId, 'time': int(time.time())},
+            {'type': 'Plain', 'text': text},
+        ],
+        'sender': {'id': sender, 'nickname': f'user{sender}', 'remark': ''},
+    }
+
+
+def groupMessage(
+    messageId: int,
+    text: str,
+    sender: int = 10000,
+    group: int = 20000,
+) -> dict[str, Any]:
+    return {
+        'type': 'GroupMessage',
+        'messageChain': [
+            {'type': 'Source', 'id': messageId, 'time': int(time.time())},
+            {'type': 'Plain', 'text': text},
+        ],
+        'sender': {
+            'id': sender,
+            'memberName': f'user{sender}',
+            'specialTitle': '',
+            'permission': 'MEMBER',
+            'joinTimestamp': 0,
+            'lastSpeakTimestamp': 0,
+            'muteTimeRemaining': 0,
+            'group': {'id': group, 'name': f'group{group}', 'permission': 'MEMBER'},
+        },
+    }
+
+
+def synthetic(texts: Iterable[str] = ('ping', 'hello world')) -> Iterator[dict[str, Any]]:
+    """
+    endless group / friend messages, each with a unique messageId
+    """
+    texts = list(texts)
+    for i in count(1):
+        text = texts[i % len(texts)]
+        if i % 4:
+            yield groupMessage(i, text, sender=10000 + i % 50, group=20000 + i % 5)
+        else:
+            yield friendMessage(i, text, sender=10000 + i % 50)
+
+
+def recorded(path: str) -> Iterator[dict[str, Any]]:
+    """
+    messages / events from a JSONL file, one `data` or whole frame per line
+    """
+    with open(path, 'r') as fp:
+        for line in fp:
+            if not line.strip(): continue
+            obj = json.loads(line)
+            yield obj['data'] if 'syncId' in obj else obj
+
+
+class FakeMirai:
+    """
+    verify handshake, echo `syncId` command responses, push messages
+    """
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 8765,
+        verifyKey: Optional[str] = None,
+        reservedSyncId: str = '-1',
+        latency: float = 0.0,
+    ) -> None:
+        """
+        :verifyKey: None to accept any key
+        :latency: seconds before answering a command
+        """
+        self.host = host
+        self.port = port
+        self.verifyKey = verifyKey
+        self.reservedSyncId = reservedSyncId
+        self.latency = latency
+        self.commands: dict[str, int] = {}
+        self.pushed = 0
+        self.pushTime: dict[int, float] = {}
+        self._messageId = count(1 << 30)
+        self._clients: set[WebSocketCommonProtocol] = set()
+        self._connected = asyncio.Event()
+        self._server: Optional[server.WebSocketServer] = None
+
+    @property
+    def host_port(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    async def __aenter__(self) -> FakeMirai:
+        self._server = await server.serve(self._handler, self.host, self.port)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> bool:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        return False
+
+    def response(self, command: str, subCommand: Optional[str], content: Any) -> dict[str, Any]:
+        if command.startswith('send') and command.endswith('Message'):
+            return {'code': 0, 'msg': 'success', 'messageId': next(self._messageId)}
+        elif command == 'about':
+            return {'code': 0, 'msg': '', 'data': {'version': 'fake'}}
+        elif command.endswith('List'):
+            return {'code': 0, 'msg': '', 'data': []}
+        else:
+            return {'code': 0, 'msg': ''}
+
+    async def _answer(self, ws: WebSocketCommonProtocol, raw: str) -> None:
+        req = json.loads(raw)
+        command = req.get('command', '')
+        self.commands[command] = self.commands.get(command, 0) + 1
+        if self.latency: await asyncio.sleep(self.latency)
+        data = self.response(command, req.get('subCommand'), req.get('content'))
+        await ws.send(json.dumps({'syncId': req['syncId'], 'data': data}))
+
+    async def _handler(self, ws: WebSocketCommonProtocol, path: str) -> None:
+        query = parse_qs(urlparse(path).query)
+        if self.verifyKey is not None and query.get('verifyKey') != [self.verifyKey]:
+            await ws.send(json.dumps({'syncId': '', 'data': {'code': 1, 'msg': 'wrong verify key'}}))
+            await ws.close()
+            return
+        await ws.send(json.dumps({'syncId': '', 'data': {'code': 0, 'session': 'fake-session'}}))
+        self._clients.add(ws)
+        self._connected.set()
+        try:
+            async for raw in ws:
+                asyncio.create_task(self._answer(ws, raw))
+        finally:
+            self._clients.discard(ws)
+            if not self._clients: self._connected.clear()
+
+    async def waitClient(self) -> None:
+        await self._connected.wait()
+
+    async def push(
+        self,
+        stream: Iterable[dict[str, Any]],
+        number: Optional[int] = None,
+        rate: float = 0,
+    ) -> None:
+        """
+        push stream to every client
+        :number: stop after number of messages, None for whole stream
+        :rate: messages per second, 0 for as fast as possible
+        """
+        await self.waitClient()
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for i, data in enumerate(stream):
+            if number is not None and i >= number: break
+            if rate:
+                wait = start + i / rate - loop.time()
+                if wait > 0: await asyncio.sleep(wait)
+            elif i % 100 == 0:
+                await asyncio.sleep(0)
+            chain = data.get('messageChain')
+            if chain and chain[0].get('type') == 'Source':
+                self.pushTime[chain[0]['id']] = time.perf_counter()
+            frame = json.dumps({'syncId': self.reservedSyncId, 'data': data})
+            for ws in list(self._clients):
+                await ws.send(frame)
+            self.pushed += 1
+
+
+async def main(host: str = '127.0.0.1', port: int = 8765, rate: float = 10) -> None:
+    async with FakeMirai(host, port) as mirai:
+        logger.info(f"fake mirai on ws://{mirai.host_port}")
+        while True:
+            await mirai.push(synthetic(), rate=rate)
+
+
+if __name__ == '__main__':
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = sys.argv[1:]
+    asyncio.run(main(*args[:1], *map(int, args[1:2]), *map(float, args[2:3])))
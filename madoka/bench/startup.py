@@ -0,0 +1,84 @@
+"""
+cold start: import time and time to first dispatch, each in a fresh process
+
+python -m madoka.bench.startup [--runs 10]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+IMPORT = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+DISPATCH = """
+import time
+start = time.perf_counter()
+import asyncio
+import gc
+from madoka import QQbot
+from madoka.bench.server import friendMessage
+from madoka.bot.transport import MemoryTransport
+
+async def main():
+    transport = MemoryTransport()
+    bot = QQbot(1, 'memory', 'memory', transport=transport)
+    done = asyncio.Event()
+
+    @bot.addFunction()
+    def first(bot, ctx):
+        done.set()
+
+    async with bot:
+        if {freeze}:
+            gc.collect()
+            gc.freeze()
+        await bot.start(block=False, schedule=False)
+        transport.feed(friendMessage(1, 'hello'))
+        await done.wait()
+        print(time.perf_counter() - start)
+        bot.stop()
+
+asyncio.run(main())
+"""
+
+CASES = {
+    'import madoka': IMPORT.format(module='madoka'),
+    'import madoka.filter': IMPORT.format(module='madoka.filter'),
+    'import madoka.bot': IMPORT.format(module='madoka.bot'),
+    'first dispatch': DISPATCH.format(freeze=False),
+    'first dispatch (gc.freeze)': DISPATCH.format(freeze=True),
+}
+
+
+def measure(code: str, runs: int) -> list[float]:
+    costs = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', code],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        costs.append(float(out.strip().splitlines()[-1]))
+    return costs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    for name, code in CASES.items():
+        costs = measure(code, args.runs)
+        print(f"{name:>28}: min {min(costs) * 1e3:7.2f} ms"
+              f"  median {statistics.median(costs) * 1e3:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
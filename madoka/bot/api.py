@@ -3,24 +3,139 @@ from __future__ import annotations
 import asyncio
 import logging
 import time
-from typing import Any, Iterable, Optional, Union
+from functools import partial
+from typing import (TYPE_CHECKING, Any, AsyncIterable, Callable, Iterable,
+                    Literal, Optional, Union)
 
-from ..typing import (Context, ForwardMessageNode, ForwardMessageText,
-                      FriendSender, GroupSender, PlainText, TempSender, Text)
+from cachetools import LRUCache
+
+from ..typing import (Chain, Context, ForwardMessageNode, ForwardMessageText,
+                      FriendSender, GroupInfo, GroupSender, PlainText,
+                      TempSender, Text, segment)
 from .base import BotBase
+from .cache import MessageCache
+from .contact import ContactCache
+from .image import ImageCache, ImageSource, encodeImage, readImage
+from .pack import MAX_NODES, MAX_SIZE, ForwardPacker
 from .solve import contextStore
 
+if TYPE_CHECKING:
+    from .broadcast import Broadcast, progressFunc
+    from .coalesce import Coalescer
+
 logger = logging.getLogger(__name__)
 
-Message = Union[str, Text, Iterable[Text]]
+Message = Union[str, Text, Chain, Iterable[Text]]
 FutureRet = asyncio.Future[dict[str, Any]]
 
 
 class ApiUnit(BotBase):
+    messageCache: MessageCache
+    contacts: ContactCache
+    _coalescer: Optional[Coalescer]
+    imageCache: ImageCache
+    _pendingImages: LRUCache[int, tuple[dict[str, Any], str, str]]
+
+    def __new__(cls, *args, **kwargs) -> Any:
+        obj = super().__new__(cls)
+        obj.messageCache = MessageCache()
+        obj.contacts = ContactCache()
+        obj._coalescer = None
+        obj.imageCache = ImageCache()
+        # base64 Image segment id -> (segment, digest, type), learn imageId once sent
+        obj._pendingImages = LRUCache(maxsize=256)
+        return obj
+
+    def enableImageCache(
+        self,
+        maxsize: int = 4096,
+        path: Optional[str] = None,
+    ) -> ImageCache:
+        """
+        :path: json file to persist imageIds across restart
+        """
+        self.imageCache = ImageCache(maxsize, path)
+        return self.imageCache
+
+    def enableCoalesce(
+        self,
+        window: float = 0.3,
+        maxDelay: float = 2.0,
+        forwardSize: int = 2000,
+    ) -> Coalescer:
+        """
+        merge `reply` to the same target within window into one message
+        large merged messages are sent as forward message
+        """
+        from .coalesce import Coalescer
+
+        self._coalescer = Coalescer(
+            self.qid,
+            self._name,
+            window,
+            maxDelay,
+            forwardSize,
+        )
+        return self._coalescer
+
+    def _remember(
+        self,
+        future: FutureRet,
+        type: str,
+        sender: dict[str, Any],
+        messageChain: list[dict[str, Any]],
+    ) -> FutureRet:
+        """
+        put sent message into messageCache once messageId is known
+        """
+        messageChain = list(messageChain)
+
+        def callback(future: FutureRet) -> None:
+            if future.cancelled() or future.exception(): return
+            resp = future.result()
+            if resp.get('code') != 0: return
+            source = segment('Source', id=resp['messageId'], time=int(time.time()))
+            self.messageCache.put(
+                resp['messageId'], {
+                    'type': type,
+                    'messageChain': [source, *messageChain],
+                    'sender': sender,
+                })
+            if self._pendingImages:
+                images = [seg for seg in messageChain if seg.get('type') == 'Image']
+                pending = {}
+                for i, seg in enumerate(images):
+                    item = self._pendingImages.pop(id(seg), None)
+                    if item is not None and item[0] is seg:
+                        pending[i] = item
+                if pending:
+                    asyncio.create_task(self._learnImages(resp['messageId'], pending))
+
+        future.add_done_callback(callback)
+        return future
+
+    def _selfMember(self, group: int) -> dict[str, Any]:
+        return {
+            'id': self.qid,
+            'memberName': self._name,
+            'specialTitle': '',
+            'permission': 'MEMBER',
+            'joinTimestamp': 0,
+            'lastSpeakTimestamp': int(time.time()),
+            'muteTimeRemaining': 0,
+            'group': {
+                'id': group,
+                'name': '',
+                'permission': 'MEMBER'
+            },
+        }
+
     @staticmethod
     def _formatMessage(message: Message) -> list[dict[str, Any]]:
         if isinstance(message, str):
-            return [PlainText(message).dict()]
+            return [segment('Plain', text=message)]
+        elif isinstance(message, Chain):
+            return message.build()
         elif isinstance(message, Text):
             return [message.dict()]
         else:
@@ -35,6 +150,7 @@ class ApiUnit(BotBase):
         Fake a ForwardMessageText to pack in one Text
         """
         nodes: list[ForwardMessageNode] = []
+        now = int(time.time())
         for i, msg in enumerate(msgs):
             if isinstance(msg, str):
                 lst: list[Text] = [PlainText(msg)]
@@ -48,38 +164,102 @@ class ApiUnit(BotBase):
             nodes.append(
                 ForwardMessageNode(
                     senderId=self.qid,
-                    time=int(time.time()),
+                    time=now,
                     senderName=name,
                     messageChain=lst,
                 ))
 
         return ForwardMessageText(nodes)  # type: ignore pylance's wrong lint
 
+    async def packSend(
+        self,
+        msgs: Union[Iterable[Message], AsyncIterable[Message]],
+        send: Optional[Callable[[Message], FutureRet]] = None,
+        numero: bool = True,
+        maxNodes: int = MAX_NODES,
+        maxSize: int = MAX_SIZE,
+        concurrency: int = 1,
+    ) -> list[Optional[int]]:
+        """
+        Pack msgs into forward messages and send them, without holding all msgs
+        :send: default is `reply`
+        :concurrency: max forward messages in flight, order is kept only if 1
+        :return: messageId of each forward message, None if failed
+        """
+        if send is None: send = self.reply
+        packer = ForwardPacker(self.qid, self._name, numero, maxNodes, maxSize)
+        sem = asyncio.Semaphore(concurrency)
+        futures: list[FutureRet] = []
+
+        async def post(chain: Chain) -> None:
+            await sem.acquire()
+            future = send(chain)
+            future.add_done_callback(lambda _: sem.release())
+            futures.append(future)
+
+        if isinstance(msgs, AsyncIterable):
+            async for msg in msgs:
+                chain = packer.add(self._formatMessage(msg))
+                if chain: await post(chain)
+        else:
+            for msg in msgs:
+                chain = packer.add(self._formatMessage(msg))
+                if chain: await post(chain)
+        chain = packer.flush()
+        if chain: await post(chain)
+
+        ret: list[Optional[int]] = []
+        for resp in await asyncio.gather(*futures, return_exceptions=True):
+            if isinstance(resp, dict) and resp.get('code') == 0:
+                ret.append(resp['messageId'])
+            else:
+                logger.error(f"packSend failed: {resp}")
+                ret.append(None)
+        return ret
+
     def sendFriendMessage(
         self,
         target: int,
         message: Message,
         quote: Optional[int] = None,
-    ) -> FutureRet:
+        noreply: bool = False,
+    ) -> Optional[FutureRet]:
         data = {
             "target": target,
             "messageChain": self._formatMessage(message),
         }
         if quote: data['quote'] = quote
-        return self.send("sendFriendMessage", None, data)
+        if noreply: return self.post("sendFriendMessage", None, data)
+        return self._remember(
+            self.send("sendFriendMessage", None, data),
+            'FriendMessage',
+            {
+                'id': self.qid,
+                'nickname': self._name,
+                'remark': ''
+            },
+            data['messageChain'],
+        )
 
     def sendGroupMessage(
         self,
         target: int,
         message: Message,
         quote: Optional[int] = None,
-    ) -> FutureRet:
+        noreply: bool = False,
+    ) -> Optional[FutureRet]:
         data = {
             "target": target,
             "messageChain": self._formatMessage(message),
         }
         if quote: data['quote'] = quote
-        return self.send('sendGroupMessage', None, data)
+        if noreply: return self.post('sendGroupMessage', None, data)
+        return self._remember(
+            self.send('sendGroupMessage', None, data),
+            'GroupMessage',
+            self._selfMember(target),
+            data['messageChain'],
+        )
 
     def sendTempMessage(
         self,
@@ -87,14 +267,46 @@ class ApiUnit(BotBase):
         group: int,
         message: Message,
         quote: Optional[int] = None,
-    ) -> FutureRet:
+        noreply: bool = False,
+    ) -> Optional[FutureRet]:
         data = {
             "qq": target,
             "group": group,
             "messageChain": self._formatMessage(message),
         }
         if quote: data['quote'] = quote
-        return self.send('sendTempMessage', None, data)
+        if noreply: return self.post('sendTempMessage', None, data)
+        return self._remember(
+            self.send('sendTempMessage', None, data),
+            'TempMessage',
+            self._selfMember(group),
+            data['messageChain'],
+        )
+
+    def broadcast(
+        self,
+        targets: Iterable[int],
+        message: Message,
+        kind: Literal['friend', 'group'] = 'group',
+        concurrency: int = 4,
+        rate: Optional[float] = None,
+        progress: Optional[progressFunc] = None,
+    ) -> Broadcast:
+        """
+        Send message to every target, message is serialized once
+        `await bot.broadcast(...)` returns the Broadcast with results and errors
+        """
+        from .broadcast import Broadcast
+
+        return Broadcast(
+            self,
+            targets,
+            self._formatMessage(message),
+            kind=kind,
+            concurrency=concurrency,
+            rate=rate,
+            progress=progress,
+        )
 
     def sendToAdmin(self, message: Message) -> FutureRet:
         if self.adminQid:
@@ -109,46 +321,202 @@ class ApiUnit(BotBase):
         self,
         message: Message,
         quoteId: Optional[int] = None,
-    ) -> FutureRet:
+        noreply: bool = False,
+    ) -> Optional[FutureRet]:
+        """
+        :noreply: don't track the response, return None
+        """
         ctx = contextStore.get(None)
         if ctx is None:
             raise RuntimeError("Unable to known reply target")
         sender = ctx.sender
         if isinstance(sender, FriendSender):
             logger.debug(f"reply to {sender.nickname} {sender.id}")
-            return self.sendFriendMessage(
-                target=sender.id,
-                message=message,
-                quote=quoteId,
-            )
+            key = ('friend', sender.id, quoteId)
+            send = partial(self.sendFriendMessage, sender.id, quote=quoteId)
         elif isinstance(sender, GroupSender):
             logger.debug(f"reply to {sender.memberName} {sender.id}")
-            return self.sendGroupMessage(
-                target=sender.group.id,
-                message=message,
-                quote=quoteId,
-            )
+            key = ('group', sender.group.id, quoteId)
+            send = partial(self.sendGroupMessage, sender.group.id, quote=quoteId)
         elif isinstance(sender, TempSender):
             logger.debug(f"reply to {sender.memberName} {sender.id}")
-            return self.sendTempMessage(
-                target=sender.id,
-                group=sender.group.id,
-                message=message,
+            key = ('temp', sender.id, sender.group.id, quoteId)
+            send = partial(
+                self.sendTempMessage,
+                sender.id,
+                sender.group.id,
                 quote=quoteId,
             )
         else:
             raise ValueError(f'Unsport Sender {sender.__class__.__name__}')
+        if self._coalescer is not None:
+            future = self._coalescer.add(key, send, self._formatMessage(message))
+            return None if noreply else future
+        return send(message, noreply=noreply)
 
-    def quoteReply(self, message: Message) -> FutureRet:
+    def quoteReply(
+        self,
+        message: Message,
+        noreply: bool = False,
+    ) -> Optional[FutureRet]:
         messageId = contextStore.get().messageId
         logger.debug(f"quote reply to messageId={messageId}")
-        return self.reply(message=message, quoteId=messageId)
+        return self.reply(message=message, quoteId=messageId, noreply=noreply)
 
-    async def messageFromId(self, messageId: int) -> Optional[Context]:
+    async def imageId(
+        self,
+        image: ImageSource,
+        type: Literal['friend', 'group', 'temp'] = 'group',
+    ) -> Optional[str]:
+        """
+        upload image once, later calls with same content return cached imageId
+        file is read and hashed off the event loop
+        :image: local file path or content
+        :return: None if upload is unavailable (need HTTP adapter) or failed
+        """
+        data, digest = await asyncio.get_running_loop().run_in_executor(
+            None, readImage, image)
+        return await self._uploadImage(data, digest, type)
+
+    async def _uploadImage(self, data: bytes, digest: str, type: str) -> Optional[str]:
+        imageId = self.imageCache.get(digest, type)
+        if imageId is not None or self._http is None:
+            return imageId
+        ret = await self._http.upload('uploadImage', {'type': type, 'img': data})
+        if 'imageId' not in ret:
+            logger.error(f"uploadImage failed: <{ret.get('code')}> {ret.get('msg')}")
+            return None
+        self.imageCache.put(digest, type, ret['imageId'])
+        self.imageCache.scheduleSave()
+        return ret['imageId']
+
+    async def _learnImages(
+        self,
+        messageId: int,
+        pending: dict[int, tuple[dict[str, Any], str, str]],
+    ) -> None:
+        """
+        ask mirai the imageId of sent base64 images, by their index in chain
+        """
+        ret = await self.send("messageFromId", None, {"id": messageId})
+        if ret.get('code') != 0: return
+        images = [
+            seg for seg in ret['data'].get('messageChain', [])
+            if seg.get('type') == 'Image'
+        ]
+        for i, (_, digest, type) in pending.items():
+            if i < len(images) and images[i].get('imageId'):
+                self.imageCache.put(digest, type, images[i]['imageId'])
+        self.imageCache.scheduleSave()
+
+    async def image(
+        self,
+        image: ImageSource,
+        type: Literal['friend', 'group', 'temp'] = 'group',
+    ) -> Chain:
+        """
+        Chain of the image, by imageId if possible, otherwise base64
+        without HTTP adapter, imageId of base64 image is learned after it is sent
+        """
+        loop = asyncio.get_running_loop()
+        data, digest = await loop.run_in_executor(None, readImage, image)
+        imageId = await self._uploadImage(data, digest, type)
+        if imageId is not None:
+            return Chain().image(imageId=imageId)
+        chain = Chain().image(base64=await loop.run_in_executor(None, encodeImage, data))
+        seg = chain.build()[-1]
+        self._pendingImages[id(seg)] = (seg, digest, type)
+        return chain
+
+    async def messageFromId(
+        self,
+        messageId: int,
+        cache: bool = True,
+    ) -> Optional[Context]:
+        """
+        :cache: look up messageCache before asking mirai
+        """
+        if cache:
+            ctx = self.messageCache.get(messageId)
+            if ctx is not None: return ctx
         ret = await self.send("messageFromId", None, {"id": messageId})
         if ret['code'] == 0:
-            return Context.parse_obj(ret['data'])
+            ctx = Context.parse_obj(ret['data'])
+            self.messageCache.put(messageId, ctx)
+            return ctx
         else:
             logger.error(f"messageFromId failed: <{ret['code']}> {ret['msg']}")
 
-    # TODO more method
+    async def friendList(self, cache: bool = True) -> Optional[list[FriendSender]]:
+        """
+        :cache: use contacts if loaded, otherwise fetch and fill it
+        """
+        if cache and self.contacts.friends is not None:
+            return list(self.contacts.friends.values())
+        ret = await self.send("friendList", None, {})
+        if ret['code'] == 0:
+            friends = [FriendSender.parse_obj(friend) for friend in ret['data']]
+            self.contacts.setFriends(friends)
+            return friends
+        else:
+            logger.error(f"friendList failed: <{ret['code']}> {ret['msg']}")
+
+    async def groupList(self, cache: bool = True) -> Optional[list[GroupInfo]]:
+        if cache and self.contacts.groups is not None:
+            return list(self.contacts.groups.values())
+        ret = await self.send("groupList", None, {})
+        if ret['code'] == 0:
+            groups = [GroupInfo.parse_obj(group) for group in ret['data']]
+            self.contacts.setGroups(groups)
+            return groups
+        else:
+            logger.error(f"groupList failed: <{ret['code']}> {ret['msg']}")
+
+    async def memberList(
+        self,
+        group: int,
+        cache: bool = True,
+    ) -> Optional[list[GroupSender]]:
+        if cache and group in self.contacts.members:
+            return list(self.contacts.members[group].values())
+        ret = await self.send("memberList", None, {"target": group})
+        if ret['code'] == 0:
+            members = [GroupSender.parse_obj(member) for member in ret['data']]
+            self.contacts.setMembers(group, members)
+            return members
+        else:
+            logger.error(f"memberList failed: <{ret['code']}> {ret['msg']}")
+
+    async def memberInfo(
+        self,
+        group: int,
+        id: int,
+        cache: bool = True,
+    ) -> Optional[GroupSender]:
+        if cache:
+            member = self.contacts.member(group, id)
+            if member is not None: return member
+        ret = await self.send("memberInfo", "get", {
+            "target": group,
+            "memberId": id
+        })
+        if ret.get('code', 0) == 0:
+            member = GroupSender.parse_obj(ret.get('data', ret))
+            self.contacts._putMember(member)
+            return member
+        else:
+            logger.error(f"memberInfo failed: <{ret['code']}> {ret['msg']}")
+
+    async def loadContacts(self, members: bool = True) -> None:
+        """
+        fill contacts in bulk, e.g. before `start`
+        :members: also fetch memberList of every group
+        """
+        await self.friendList(cache=False)
+        groups = await self.groupList(cache=False)
+        if members and groups:
+            await asyncio.gather(
+                *(self.memberList(group.id, cache=False) for group in groups))
+        logger.info(
+            f"contacts loaded: {len(self.contacts.friends or ())} friends, "
+            f"{len(self.contacts.groups or ())} groups")
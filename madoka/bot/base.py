@@ -3,13 +3,19 @@ from __future__ import annotations
 import asyncio
 import json
 import logging
+import time
 from itertools import count
-from typing import (TYPE_CHECKING, Any, AsyncGenerator, Coroutine, Literal,
-                    Optional)
+from typing import (TYPE_CHECKING, Any, AsyncGenerator, Awaitable, Coroutine,
+                    Literal, Optional)
 
 from cachetools import TTLCache
-from websockets.exceptions import ConnectionClosedError
-from websockets.legacy import client
+
+from .. import metrics
+from ..log import Payload, logPayload
+from ..trace import traceStore
+from .http import HttpAdapter
+from .probe import LatencyProbe
+from .transport import Transport, TransportClosed, WebsocketTransport
 
 if TYPE_CHECKING:
     from .bot import QQbot
@@ -26,8 +32,70 @@ class FutureCache(TTLCache[str, asyncio.Future[dict[str, Any]]]):
         v.set_exception(TimeoutError("Receive response timeout"))
         return k, v
 
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for k, v in expired or ():
+            logger.warning(f"Receive response timeout syncId={k}")
+            if not v.done(): v.set_exception(TimeoutError("Receive response timeout"))
+        return expired
+
+
+class HandlerExpired(Exception):
+    """
+    the handler is cancelled by its timeout
+    """
+
+
+async def waitHandler(aw: Awaitable[Any], timeout: Optional[float]) -> None:
+    """
+    like `asyncio.wait_for`, but raise `HandlerExpired` only if timeout is hit
+    TimeoutError raised by the handler itself is propagated as is
+    """
+    if timeout is None:
+        await aw
+        return
+    task = asyncio.ensure_future(aw)
+    try:
+        done, _ = await asyncio.wait((task, ), timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if not done:
+        task.cancel()
+        await asyncio.wait((task, ))
+        if not task.cancelled(): task.exception()
+        raise HandlerExpired(timeout)
+    task.result()
+
+
+class ErrorSampler:
+    """
+    aggregate errors, log a summary at most once per interval
+    """
+    def __init__(self, name: str, interval: float = 60) -> None:
+        self.name = name
+        self.interval = interval
+        self.total = 0
+        self._counts: dict[str, int] = {}
+        self._last = -interval
+
+    def add(self, error: str) -> None:
+        self.total += 1
+        self._counts[error] = self._counts.get(error, 0) + 1
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            summary = ', '.join(f"{k} x{v}" for k, v in self._counts.items())
+            logger.warning(f"{self.name} failed: {summary}")
+            self._counts.clear()
+
 
 class BotBase:
+    # default seconds before an async handler is cancelled, None for no limit
+    handlerTimeout: Optional[float] = None
+    # adaptive response timeout and reconnect, see `enableProbe`
+    probe: Optional[LatencyProbe] = None
+
     def __init__(
         self,
         qid: int,
@@ -39,53 +107,98 @@ class BotBase:
         channel: Literal['message', 'event', 'all'] = 'all',
         protocol: Literal['ws', 'wss'] = 'ws',
         reservedSyncId: int = -1,
+        transport: Optional[Transport] = None,
+        http: Optional[HttpAdapter] = None,
     ) -> None:
+        """
+        :transport: default is websocket to `host`
+        :http: send API commands by HTTP adapter instead of transport
+        """
         self.qid = qid
         self._name = name
         self.adminQid = adminQid
-        self._waitMirai = waitMirai
         self._reservedSyncId = str(reservedSyncId)
-        self._wsurl = f"{protocol}://{host}/{channel}?verifyKey={verifyKey}&qq={qid}"
+        if transport is None:
+            transport = WebsocketTransport(
+                f"{protocol}://{host}/{channel}?verifyKey={verifyKey}&qq={qid}",
+                waitMirai,
+            )
+        self._transport = transport
+        self._http = http
 
         self._curSyncId = count()
         self._futures = FutureCache(maxsize=10000, ttl=3600)
+        self._postErrors = ErrorSampler('post')
         self._tasks: list[asyncio.Task] = []
 
         # self._bot just use for typing hinting
         self._bot: QQbot = self  # type: ignore
 
     async def __aenter__(self) -> BotBase:
-        logger.debug("Connect to Websocket Adapter")
-        await self._wsconnect()
-        self._session = json.loads(await self._ws.recv())['data']['session']
-        logger.info(f"successfully connect: sessionKey={self._session}")
+        self._connected = asyncio.Event()
+        self._connections = 0
+        await self._connect()
+        # registered while connected only, registry keeps no closed bot
+        metrics.futures.setFunction(lambda: len(self._futures), str(self.qid))
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb) -> bool:
-        logger.debug("Disconnect to Websocket Adapter")
-        await self._ws.close()
+        logger.debug(f"Disconnect by {self._transport.__class__.__name__}")
+        self._connected.clear()
+        metrics.futures.remove(str(self.qid))
+        if self._http is not None:
+            await self._http.close()
+        await self._transport.close()
         return False
 
-    async def _wsconnect(self) -> None:
-        self._connect = client.Connect(self._wsurl)
-        if self._waitMirai is None:
-            self._waitMirai = 1
-        cnt = 0
-        while not (cnt and cnt == self._waitMirai):
-            try:
-                cnt += 1
-                self._ws = await self._connect
-            except:
-                if self._waitMirai != 1:
-                    logger.debug(f"get api information failed: {cnt} times")
-                if cnt != self._waitMirai:
-                    await asyncio.sleep(3)
-                else:
-                    logger.error("Unable to connect to mirai-api-http")
-                    raise
-            else:
-                if cnt != 1: await asyncio.sleep(3)
-                break
+    async def _connect(self) -> None:
+        logger.debug(f"Connect by {self._transport.__class__.__name__}")
+        await self._transport.connect()
+        resp = json.loads(await self._transport.recv())['data']
+        if 'session' not in resp:
+            await self._transport.close()
+            raise RuntimeError(f"verify failed: {resp}")
+        self._session = resp['session']
+        logger.info(f"successfully connect: sessionKey={self._session}")
+        if self._http is not None:
+            await self._http.open(self._session)
+        self._connections += 1
+        self._connected.set()
+
+    async def reconnect(self) -> None:
+        """
+        drop the connection and connect again
+        pending responses are failed with ConnectionError
+        """
+        logger.warning(f"Reconnect bot {self.qid}")
+        self._connected.clear()
+        if self._http is not None:
+            await self._http.close()
+        try:
+            await self._transport.close()
+        except Exception as e:
+            logger.debug(f"close transport: {e!r}")
+        for future in self._futures.values():
+            if not future.done():
+                future.set_exception(ConnectionError("Connection reset by reconnect"))
+        self._futures.clear()
+        await self._connect()
+
+    def health(self) -> dict[str, Any]:
+        """
+        status is 'ok', 'degraded' or 'down'
+        rtt and jitter are None unless `enableProbe`
+        """
+        connected = self._connected.is_set() if hasattr(self, '_connected') else False
+        if self.probe is not None:
+            health = self.probe.health()
+        else:
+            health = {'status': 'ok', 'rtt': None, 'jitter': None}
+        if not connected:
+            health['status'] = 'down'
+        health['connected'] = connected
+        health['pending'] = len(self._futures)
+        return health
 
     def send(
         self,
@@ -93,34 +206,141 @@ class BotBase:
         subCommand: Optional[str],
         content: dict[str, Any],
     ) -> asyncio.Future[dict[str, Any]]:
-        syncId = str(next(self._curSyncId))
-        data = json.dumps({
-            "syncId": syncId,
-            "command": command,
-            "subCommand": subCommand,
-            "content": content
-        })
-        logger.info(f"[{command}] {subCommand}: {content}")
-        self._futures[syncId] = asyncio.Future()
-        asyncio.create_task(self._ws.send(data))
-        return self._futures[syncId]
+        logPayload(logger, logging.INFO, 'send', "[%s] %s: %s", command,
+                   subCommand, Payload(content))
+        return self._post(command, subCommand, json.dumps(content))
+
+    def sendJson(
+        self,
+        command: str,
+        subCommand: Optional[str],
+        content: str,
+    ) -> asyncio.Future[dict[str, Any]]:
+        """
+        same as `send`, but content is already serialized
+        """
+        logPayload(logger, logging.INFO, 'send', "[%s] %s: %s", command,
+                   subCommand, Payload(content))
+        return self._post(command, subCommand, content)
+
+    def post(
+        self,
+        command: str,
+        subCommand: Optional[str],
+        content: dict[str, Any],
+    ) -> None:
+        """
+        same as `send`, but response is not tracked
+        failures are aggregated into a sampled warning
+        """
+        logPayload(logger, logging.INFO, 'send', "[%s] %s: %s", command,
+                   subCommand, Payload(content))
+        self._postNoreply(command, subCommand, json.dumps(content))
+
+    @staticmethod
+    def _frame(
+        syncId: str,
+        command: str,
+        subCommand: Optional[str],
+        content: str,
+    ) -> str:
+        return (f'{{"syncId": "{syncId}", "command": {json.dumps(command)}, '
+                f'"subCommand": {json.dumps(subCommand)}, "content": {content}}}')
+
+    def _postNoreply(
+        self,
+        command: str,
+        subCommand: Optional[str],
+        content: str,
+    ) -> None:
+        if self._http is not None:
+            future = self._http.request(command, subCommand, content)
+            future.add_done_callback(self._postDone)
+        else:
+            # response of syncId starting with '~' is only checked for error
+            syncId = f"~{next(self._curSyncId)}"
+            data = self._frame(syncId, command, subCommand, content)
+            asyncio.create_task(self._transport.send(data))
+
+    def _postDone(self, future: asyncio.Future[dict[str, Any]]) -> None:
+        if future.cancelled(): return
+        if future.exception() is not None:
+            self._postErrors.add(repr(future.exception()))
+        else:
+            self._checkPost(future.result())
+
+    def _checkPost(self, data: dict[str, Any]) -> None:
+        code = data.get('code', 0)
+        if code != 0:
+            self._postErrors.add(f"<{code}> {data.get('msg')}")
+
+    def _post(
+        self,
+        command: str,
+        subCommand: Optional[str],
+        content: str,
+    ) -> asyncio.Future[dict[str, Any]]:
+        if self._http is not None:
+            future = self._http.request(command, subCommand, content)
+        else:
+            syncId = str(next(self._curSyncId))
+            data = self._frame(syncId, command, subCommand, content)
+            future = asyncio.Future()
+            self._futures[syncId] = future
+            asyncio.create_task(self._transport.send(data))
+            if self.probe is not None:
+                handle = asyncio.get_running_loop().call_later(
+                    self.probe.responseTimeout, self._expire, syncId)
+                future.add_done_callback(lambda _: handle.cancel())
+        trace = traceStore.get()
+        if trace is not None:
+            # closed when the response arrives in `_recv`
+            future.add_done_callback(
+                trace.span('send', command=command, subCommand=subCommand).finish)
+        if metrics.registry.enabled:
+            start = time.perf_counter()
+            future.add_done_callback(lambda _: metrics.apiSeconds.observe(
+                time.perf_counter() - start,
+                command,
+            ))
+        return future
+
+    def _expire(self, syncId: str) -> None:
+        future = self._futures.pop(syncId, None)
+        if future is None or future.done(): return
+        logger.warning(f"Receive response timeout syncId={syncId}")
+        if self.probe is not None: self.probe.timeouts += 1
+        future.set_exception(TimeoutError("Receive response timeout"))
 
     async def _recv(self) -> AsyncGenerator[dict[str, Any], None]:
         logger.debug("Start receiving")
         while True:
-            resp = json.loads(await self._ws.recv())
+            connections = self._connections
+            try:
+                frame = await self._transport.recv()
+            except EOFError:
+                logger.info("No more frames from transport")
+                return
+            except TransportClosed:
+                if self._connected.is_set() and connections == self._connections:
+                    raise
+                # closed by `reconnect`
+                await self._connected.wait()
+                continue
+            resp = json.loads(frame)
             syncId: str = resp['syncId']
             data: dict[str, Any] = resp['data']
             if syncId == self._reservedSyncId:
-                logger.info(f"Received: {data=}")
+                logPayload(logger, logging.INFO, 'recv', "Received: %s", Payload(data))
                 yield data
+            elif syncId[:1] == '~':
+                self._checkPost(data)
             else:
                 future = self._futures.pop(syncId, None)
-                if future:
-                    logger.debug(f"Response: {syncId=} {data=}")
+                logPayload(logger, logging.DEBUG, 'response', "Response: %s %s",
+                           syncId, Payload(data))
+                if future and not future.done():
                     future.set_result(data)
-                else:
-                    logger.debug(f"Response: {syncId=} {data=}")
 
     def _startTask(self, cor: Coroutine[None, None, None]) -> asyncio.Task:
         task = asyncio.create_task(cor)
@@ -133,9 +353,9 @@ class BotBase:
             await asyncio.gather(*self._tasks)
         except asyncio.CancelledError:
             logger.debug("Task cancelled")
-        except ConnectionClosedError:
-            logger.error(f"websockets connection closed")
-            raise RuntimeError("websockets connection closed") from None
+        except TransportClosed as e:
+            logger.error(f"transport closed: {e}")
+            raise RuntimeError(str(e)) from None
 
     def stop(self) -> None:
         logger.info(f"Stoping Bot {self.qid}")
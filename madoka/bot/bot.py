@@ -1,16 +1,29 @@
 from __future__ import annotations
 
 import asyncio
+import gc
 import logging
+import re
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
 
 from .api import ApiUnit
+from .probe import LatencyProbe
 from .schedule import ScheduleUnit
 from .solve import SolveUnit
 
+if TYPE_CHECKING:
+    from ..typing import Context
+    from .api import Message
+    from .plugin import PluginManager, PluginRef
+    from .watchdog import BlockReport, Watchdog
+
 logger = logging.getLogger(__name__)
 
 
 class QQbot(ApiUnit, ScheduleUnit, SolveUnit):
+    watchdog: Optional[Watchdog] = None
+    plugins: Optional[PluginManager] = None
+
     def __enter__(self) -> None:
         raise TypeError("Use 'async with' instead")
 
@@ -36,12 +49,119 @@ class QQbot(ApiUnit, ScheduleUnit, SolveUnit):
         block: bool = True,
         receive: bool = True,
         schedule: bool = True,
+        contacts: bool = False,
     ):
+        """
+        :contacts: load friend, group and member lists after start receiving
+        """
         if receive: self._startTask(self._solve())
         if schedule: self._startTask(self._schedule())
+        if contacts: self._startTask(self.loadContacts())
+        if self.watchdog: self._startTask(self.watchdog.run())
+        if self.probe: self._startTask(self.probe.run())
         if block:
             await self.wait()
 
+    def enableWatchdog(
+        self,
+        threshold: float = 0.5,
+        interval: float = 0.1,
+        callback: Optional[Callable[[BlockReport], None]] = None,
+    ) -> Watchdog:
+        """
+        report handlers which block the event loop longer than threshold
+        take effect at `start`
+        """
+        from .watchdog import Watchdog
+
+        self.watchdog = Watchdog(self, threshold, interval, callback)
+        return self.watchdog
+
+    def enableProbe(
+        self,
+        interval: float = 30,
+        failures: int = 2,
+        minTimeout: float = 5,
+        maxTimeout: float = 60,
+    ) -> LatencyProbe:
+        """
+        probe the connection with `about`, derive response timeout from rtt
+        reconnect after `failures` consecutive failed probes
+        take effect at `start`, see `health`
+        """
+        self.probe = LatencyProbe(
+            self,
+            interval,
+            failures=failures,
+            minTimeout=minTimeout,
+            maxTimeout=maxTimeout,
+        )
+        return self.probe
+
+    def enableProfileCommand(
+        self,
+        command: str = '/profile',
+        directory: Optional[str] = 'profiles',
+        maxSeconds: float = 300,
+    ) -> None:
+        """
+        admin sends `/profile [seconds] [mem]`, get hot functions as forward message
+        see `madoka.profile.capture` for Python API
+        not limited by `handlerTimeout` or `messageBudget`
+        """
+        from ..filter import isAdmin, isText
+        from ..profile import capture
+
+        # time to save the profile and reply after capturing
+        timeout = maxSeconds + 60
+
+        @self.addFunction(isAdmin & isText(f"^{re.escape(command)}( |$)"), timeout)
+        async def profileCommand(bot: QQbot, ctx: Context) -> None:
+            # keep capturing if this handler is cancelled by messageBudget
+            await asyncio.shield(asyncio.create_task(profile(bot, ctx)))
+
+        async def profile(bot: QQbot, ctx: Context) -> None:
+            args = ctx.text.split()[1:]
+            try:
+                seconds = min(float(args[0]), maxSeconds) if args else 10.0
+            except ValueError:
+                bot.reply(f"usage: {command} [seconds] [mem]")
+                return
+            memory = 'mem' in args[1:]
+            bot.reply(f"profiling {seconds}s" + (" with tracemalloc" if memory else ""))
+            try:
+                result = await capture(seconds, memory, directory=directory)
+            except RuntimeError as e:
+                bot.reply(str(e))
+                return
+            msgs: list[Message] = [
+                f"profile {seconds}s, saved to {result.path}",
+                "own time, total time, calls, function\n" + '\n'.join(result.hot),
+            ]
+            if result.memory:
+                msgs.append("allocations\n" + '\n'.join(result.memory))
+            bot.reply(bot.pack(msgs))
+
+    def usePlugin(
+        self,
+        module: str,
+        types: Optional[Iterable[str]] = None,
+        prefixes: Optional[Iterable[str]] = None,
+        lazy: bool = True,
+    ) -> PluginRef:
+        """
+        :module: name of module with `Plugin` in it
+        :types: message types which trigger loading, e.g. 'GroupMessage'
+        :prefixes: text prefixes which trigger loading, e.g. '/weather'
+        :lazy: import on first matching message, needs types or prefixes
+        unload or reload by `plugins.unload` and `plugins.reload`
+        """
+        if self.plugins is None:
+            from .plugin import PluginManager
+
+            self.plugins = PluginManager(self)
+        return self.plugins.use(module, types, prefixes, lazy)
+
     def simple_running(self) -> None:
         async def main():
             async with self as bot:
@@ -49,3 +169,28 @@ class QQbot(ApiUnit, ScheduleUnit, SolveUnit):
 
         logger.debug("Simple running bot")
         asyncio.run(main())
+
+    def fast_running(self, freeze: bool = True, uvloop: bool = True) -> None:
+        """
+        same as `simple_running`, tuned for short-lived processes
+        :freeze: move objects created during setup out of gc, after connecting
+        :uvloop: use uvloop if installed
+        """
+        async def main():
+            async with self as bot:
+                if freeze:
+                    gc.collect()
+                    gc.freeze()
+                    logger.debug(f"gc freeze {gc.get_freeze_count()} objects")
+                await bot.start()
+
+        if uvloop:
+            try:
+                import uvloop as _uvloop
+            except ImportError:
+                logger.debug("uvloop is not installed")
+            else:
+                asyncio.set_event_loop_policy(_uvloop.EventLoopPolicy())
+
+        logger.debug("Fast running bot")
+        asyncio.run(main())
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import (TYPE_CHECKING, Any, Callable, Generator, Iterable, Literal,
+                    Optional)
+
+if TYPE_CHECKING:
+    from .base import BotBase
+
+logger = logging.getLogger(__name__)
+
+progressFunc = Callable[[int, int], None]
+
+
+class Broadcast:
+    """
+    send one messageChain to many targets
+    await it to run, cancel() to stop, await again to resume
+    targets cancelled in flight are in errors as 'cancelled in flight'
+    """
+    def __init__(
+        self,
+        bot: BotBase,
+        targets: Iterable[int],
+        messageChain: list[dict[str, Any]],
+        kind: Literal['friend', 'group'] = 'group',
+        concurrency: int = 4,
+        rate: Optional[float] = None,
+        progress: Optional[progressFunc] = None,
+    ) -> None:
+        """
+        :concurrency: max messages in flight
+        :rate: max messages sent per second, None for unlimited
+        :progress: called with (finished, total) after each target
+        """
+        self._bot = bot
+        self._command = 'sendGroupMessage' if kind == 'group' else 'sendFriendMessage'
+        self._chain = json.dumps(messageChain)
+        self.concurrency = concurrency
+        self.rate = rate
+        self.progress = progress
+
+        self.pending: deque[int] = deque(targets)
+        self.total = len(self.pending)
+        self.results: dict[int, int] = {}
+        self.errors: dict[int, str] = {}
+        self._cancelled = False
+        self._next = 0.0
+
+    def __await__(self) -> Generator[Any, None, Broadcast]:
+        return self.run().__await__()
+
+    def __repr__(self) -> str:
+        return (f"Broadcast(total={self.total}, succeed={len(self.results)}, "
+                f"failed={len(self.errors)}, pending={len(self.pending)})")
+
+    @property
+    def finished(self) -> int:
+        return len(self.results) + len(self.errors)
+
+    @property
+    def done(self) -> bool:
+        return not self.pending
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            'total': self.total,
+            'succeed': len(self.results),
+            'failed': len(self.errors),
+            'pending': len(self.pending),
+            'errors': dict(self.errors),
+        }
+
+    def cancel(self) -> None:
+        """
+        stop taking new targets, messages in flight still finish
+        """
+        self._cancelled = True
+
+    async def run(self) -> Broadcast:
+        self._cancelled = False
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+        logger.info(f"broadcast: {self!r}")
+        return self
+
+    async def _throttle(self) -> None:
+        if not self.rate: return
+        now = asyncio.get_running_loop().time()
+        wait = self._next - now
+        self._next = max(now, self._next) + 1 / self.rate
+        if wait > 0: await asyncio.sleep(wait)
+
+    async def _worker(self) -> None:
+        while self.pending and not self._cancelled:
+            await self._throttle()
+            if not self.pending or self._cancelled: break
+            target = self.pending.popleft()
+            content = f'{{"target": {int(target)}, "messageChain": {self._chain}}}'
+            try:
+                resp = await self._bot.sendJson(self._command, None, content)
+            except Exception as e:
+                self.errors[target] = repr(e)
+            except BaseException:
+                # the frame may be sent already, not requeued to avoid sending twice
+                self.errors[target] = 'cancelled in flight'
+                raise
+            else:
+                if resp.get('code') == 0:
+                    self.results[target] = resp['messageId']
+                else:
+                    self.errors[target] = f"<{resp.get('code')}> {resp.get('msg')}"
+            if self.progress:
+                try:
+                    self.progress(self.finished, self.total)
+                except:
+                    logger.exception("broadcast progress")
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Optional, Union
+
+from cachetools import TTLCache
+from pydantic import ValidationError
+
+from ..typing import Context
+
+logger = logging.getLogger(__name__)
+
+
+class MessageCache:
+    """
+    bounded store of seen messages, keyed by messageId
+    raw dict is parsed into Context on first hit
+    """
+    def __init__(self, maxsize: int = 4096, ttl: float = 3600) -> None:
+        """
+        :maxsize: max messages kept, the least recently used is dropped
+        :ttl: seconds a message is kept
+        """
+        self._cache: TTLCache[int, Union[Context, dict[str, Any]]] = TTLCache(
+            maxsize=maxsize,
+            ttl=ttl,
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def __contains__(self, messageId: int) -> bool:
+        return messageId in self._cache
+
+    def put(self, messageId: int, msg: Union[Context, dict[str, Any]]) -> None:
+        if self._cache.maxsize:
+            self._cache[messageId] = msg
+
+    def get(self, messageId: int) -> Optional[Context]:
+        msg = self._cache.get(messageId)
+        if msg is None:
+            self.misses += 1
+            return None
+        if isinstance(msg, dict):
+            try:
+                msg = Context.parse_obj(msg)
+            except ValidationError:
+                logger.debug(f"drop unparsable cached message {messageId}")
+                del self._cache[messageId]
+                self.misses += 1
+                return None
+            self._cache[messageId] = msg
+        self.hits += 1
+        return msg
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    @property
+    def hitRate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            'size': len(self._cache),
+            'maxsize': self._cache.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hitRate,
+        }
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Hashable, Optional
+
+from ..typing import Chain
+from .pack import ForwardPacker
+
+logger = logging.getLogger(__name__)
+
+FutureRet = asyncio.Future[dict[str, Any]]
+sendFunc = Callable[[Chain], FutureRet]
+
+# segments which mirai sends as a message of their own, never merged
+SOLO_TYPES = frozenset({
+    'Forward', 'FlashImage', 'Voice', 'App', 'Json', 'Xml', 'Poke', 'Dice',
+    'MarketFace', 'MusicShare', 'File'
+})
+
+
+class _Bucket:
+    def __init__(self, send: sendFunc, start: float) -> None:
+        self.send = send
+        self.start = start
+        self.chains: list[list[dict[str, Any]]] = []
+        self.futures: list[FutureRet] = []
+        self.size = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class Coalescer:
+    """
+    merge messages to the same target sent within a short window
+    each caller still get its own future, resolved by the merged send
+    """
+    def __init__(
+        self,
+        senderId: int,
+        senderName: str,
+        window: float = 0.3,
+        maxDelay: float = 2.0,
+        forwardSize: int = 2000,
+    ) -> None:
+        """
+        :window: seconds to wait for next message, restarted by each one
+        :maxDelay: seconds the first message wait at most
+        :forwardSize: serialized size to send as forward message instead
+        """
+        self.senderId = senderId
+        self.senderName = senderName
+        self.window = window
+        self.maxDelay = maxDelay
+        self.forwardSize = forwardSize
+        self.merged = 0
+        self._buckets: dict[Hashable, _Bucket] = {}
+
+    def add(
+        self,
+        key: Hashable,
+        send: sendFunc,
+        messageChain: list[dict[str, Any]],
+    ) -> FutureRet:
+        loop = asyncio.get_running_loop()
+        if any(seg.get('type') in SOLO_TYPES for seg in messageChain):
+            # keep order, send queued ones first
+            self.flush(key)
+            solo: FutureRet = loop.create_future()
+            chain = Chain()
+            chain.build().extend(messageChain)
+            try:
+                send(chain).add_done_callback(lambda r: _chain(r, solo))
+            except Exception as e:
+                solo.set_exception(e)
+            return solo
+        now = loop.time()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(send, now)
+        elif bucket.timer:
+            bucket.timer.cancel()
+            self.merged += 1
+        future: FutureRet = loop.create_future()
+        bucket.chains.append(list(messageChain))
+        bucket.futures.append(future)
+        bucket.size += len(json.dumps(messageChain))
+        delay = min(self.window, bucket.start + self.maxDelay - now)
+        bucket.timer = loop.call_later(max(delay, 0), self.flush, key)
+        return future
+
+    def flushAll(self) -> None:
+        for key in list(self._buckets):
+            self.flush(key)
+
+    def flush(self, key: Hashable) -> None:
+        bucket = self._buckets.pop(key, None)
+        if bucket is None: return
+        if bucket.timer: bucket.timer.cancel()
+
+        if bucket.size > self.forwardSize and len(bucket.chains) > 1:
+            packer = ForwardPacker(self.senderId, self.senderName, numero=False)
+            index: list[int] = []
+            sends: list[Chain] = []
+            for chain in bucket.chains:
+                ret = packer.add(chain)
+                if ret: sends.append(ret)
+                index.append(len(sends))
+            ret = packer.flush()
+            if ret: sends.append(ret)
+        else:
+            merged = Chain()
+            for i, chain in enumerate(bucket.chains):
+                if i: merged.add('Plain', text='\n')
+                merged.build().extend(chain)
+            index = [0] * len(bucket.chains)
+            sends = [merged]
+
+        results: list[Optional[FutureRet]] = []
+        for chain in sends:
+            try:
+                results.append(bucket.send(chain))
+            except Exception as e:
+                logger.exception("coalesced send")
+                results.append(None)
+                error = e
+
+        for i, future in zip(index, bucket.futures):
+            result = results[i]
+            if result is None:
+                future.set_exception(error)
+            else:
+                result.add_done_callback(lambda r, f=future: _chain(r, f))
+
+
+def _chain(src: FutureRet, dst: FutureRet) -> None:
+    if dst.done(): return
+    if src.cancelled():
+        dst.cancel()
+    elif src.exception() is not None:
+        dst.set_exception(src.exception())  # type: ignore
+    else:
+        dst.set_result(src.result())
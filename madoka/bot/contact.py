@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from ..typing import (BotGroupPermissionChangeEvent, BotJoinGroupEvent,
+                      BotLeaveEventActive, BotLeaveEventDisband,
+                      BotLeaveEventKick, Event, FriendAddEvent,
+                      FriendDeleteEvent, FriendNickChangedEvent, FriendSender,
+                      GroupInfo, GroupNameChangeEvent, GroupSender,
+                      MemberCardChangeEvent, MemberJoinEvent,
+                      MemberLeaveEventKick, MemberLeaveEventQuit,
+                      MemberPermissionChangeEvent,
+                      MemberSpecialTitleChangeEvent)
+
+
+class ContactCache:
+    """
+    local copy of friend, group and member lists
+    a list not loaded yet is None / missing, so caller knows to fetch it
+    """
+    def __init__(self) -> None:
+        self.friends: Optional[dict[int, FriendSender]] = None
+        self.groups: Optional[dict[int, GroupInfo]] = None
+        self.members: dict[int, dict[int, GroupSender]] = {}
+
+    def clear(self) -> None:
+        self.friends = None
+        self.groups = None
+        self.members = {}
+
+    def setFriends(self, friends: list[FriendSender]) -> None:
+        self.friends = {friend.id: friend for friend in friends}
+
+    def setGroups(self, groups: list[GroupInfo]) -> None:
+        self.groups = {group.id: group for group in groups}
+
+    def setMembers(self, group: int, members: list[GroupSender]) -> None:
+        self.members[group] = {member.id: member for member in members}
+
+    def friend(self, id: int) -> Optional[FriendSender]:
+        return self.friends.get(id) if self.friends is not None else None
+
+    def group(self, id: int) -> Optional[GroupInfo]:
+        return self.groups.get(id) if self.groups is not None else None
+
+    def member(self, group: int, id: int) -> Optional[GroupSender]:
+        members = self.members.get(group)
+        return members.get(id) if members is not None else None
+
+    def isFriend(self, id: int) -> bool:
+        return self.friends is not None and id in self.friends
+
+    def _putMember(self, member: GroupSender) -> None:
+        members = self.members.get(member.group.id)
+        if members is not None:
+            members[member.id] = member
+
+    def _popMember(self, member: GroupSender) -> None:
+        members = self.members.get(member.group.id)
+        if members is not None:
+            members.pop(member.id, None)
+
+    def _putFriend(self, friend: FriendSender) -> None:
+        if self.friends is not None:
+            self.friends[friend.id] = friend
+
+    def _putGroup(self, group: GroupInfo) -> None:
+        if self.groups is not None:
+            self.groups[group.id] = group
+
+    def update(self, event: Event) -> None:
+        """
+        apply friend / member / group change events
+        """
+        if isinstance(event, FriendAddEvent):
+            self._putFriend(event.friend)
+        elif isinstance(event, FriendDeleteEvent):
+            if self.friends is not None:
+                self.friends.pop(event.friend.id, None)
+        elif isinstance(event, FriendNickChangedEvent):
+            self._putFriend(event.friend.copy(update={'nickname': event.current}))
+        elif isinstance(event, MemberJoinEvent):
+            self._putMember(event.member)
+        elif isinstance(event, (MemberLeaveEventKick, MemberLeaveEventQuit)):
+            self._popMember(event.member)
+        elif isinstance(event, MemberCardChangeEvent):
+            self._putMember(event.member.copy(update={'memberName': event.current}))
+        elif isinstance(event, MemberSpecialTitleChangeEvent):
+            self._putMember(event.member.copy(update={'specialTitle': event.current}))
+        elif isinstance(event, MemberPermissionChangeEvent):
+            self._putMember(event.member.copy(update={'permission': event.current}))
+        elif isinstance(event, BotJoinGroupEvent):
+            self._putGroup(event.group)
+        elif isinstance(event, (BotLeaveEventActive, BotLeaveEventKick, BotLeaveEventDisband)):
+            if self.groups is not None:
+                self.groups.pop(event.group.id, None)
+            self.members.pop(event.group.id, None)
+        elif isinstance(event, BotGroupPermissionChangeEvent):
+            self._putGroup(event.group.copy(update={'permission': event.current}))
+        elif isinstance(event, GroupNameChangeEvent):
+            self._putGroup(event.group.copy(update={'name': event.current}))
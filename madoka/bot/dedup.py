@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Hashable, Optional
+
+
+class DedupWindow:
+    """
+    keys seen in the last `window` seconds, at most `maxsize` keys kept
+    """
+    def __init__(self, window: float = 120, maxsize: int = 65536) -> None:
+        self.window = window
+        self.maxsize = maxsize
+        self.dropped = 0
+        # insertion order is time order
+        self._keys: dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _expire(self, now: float) -> None:
+        keys = self._keys
+        deadline = now - self.window
+        while keys:
+            key = next(iter(keys))
+            if keys[key] > deadline:
+                break
+            del keys[key]
+
+    def seen(self, key: Hashable) -> bool:
+        """
+        :return: True if key is duplicate, otherwise remember it
+        """
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._keys:
+            self.dropped += 1
+            return True
+        self._keys[key] = now
+        if len(self._keys) > self.maxsize:
+            del self._keys[next(iter(self._keys))]
+        return False
+
+    @staticmethod
+    def messageKey(data: dict[str, Any]) -> Optional[tuple]:
+        """
+        (type, group, sender, messageId) of raw message, None if no Source
+        """
+        chain = data.get('messageChain')
+        if not chain or chain[0].get('type') != 'Source':
+            return None
+        sender = data.get('sender') or {}
+        group = sender.get('group')
+        return (
+            data['type'],
+            group.get('id') if group else None,
+            sender.get('id'),
+            chain[0].get('id'),
+        )
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Hashable, Iterable, Literal, Optional
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'last')
+
+    def __init__(self, tokens: float, now: float) -> None:
+        self.tokens = tokens
+        self.last = now
+
+    def refill(self, now: float, rate: float, burst: float) -> None:
+        self.tokens = min(burst, self.tokens + (now - self.last) * rate)
+        self.last = now
+
+    def wait(self, rate: float) -> float:
+        """
+        seconds until a token is available, tokens may be reserved (negative)
+        """
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / rate
+
+
+class FloodLimiter:
+    """
+    token bucket per sender and per group, checked on raw message
+    """
+    def __init__(
+        self,
+        senderRate: Optional[float] = 1,
+        senderBurst: float = 5,
+        groupRate: Optional[float] = 5,
+        groupBurst: float = 20,
+        allow: Iterable[int] = (),
+        mode: Literal['drop', 'defer'] = 'drop',
+        maxDelay: float = 10,
+        maxsize: int = 65536,
+    ) -> None:
+        """
+        :senderRate: messages per second of a sender, None for no limit
+        :senderBurst: messages a sender may send at once
+        :groupRate: messages per second of a group, None for no limit
+        :groupBurst: messages a group may receive at once
+        :allow: senders never limited
+        :mode: drop over-limit messages, or defer them until tokens are available
+        :maxDelay: seconds a message may be deferred, dropped if longer
+        :maxsize: buckets kept for each scope, least recently used are evicted
+        """
+        self.senderRate = senderRate
+        self.senderBurst = senderBurst
+        self.groupRate = groupRate
+        self.groupBurst = groupBurst
+        self.allow = set(allow)
+        self.mode = mode
+        self.maxDelay = maxDelay
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.deferred = 0
+        self._senders: dict[Hashable, TokenBucket] = {}
+        self._groups: dict[Hashable, TokenBucket] = {}
+
+    def _bucket(
+        self,
+        buckets: dict[Hashable, TokenBucket],
+        key: Hashable,
+        now: float,
+        rate: float,
+        burst: float,
+    ) -> TokenBucket:
+        bucket = buckets.pop(key, None)
+        if bucket is None:
+            bucket = TokenBucket(burst, now)
+            if len(buckets) >= self.maxsize:
+                del buckets[next(iter(buckets))]
+        else:
+            bucket.refill(now, rate, burst)
+        # keep recently used buckets at the end
+        buckets[key] = bucket
+        return bucket
+
+    def admit(self, data: dict[str, Any]) -> Optional[float]:
+        """
+        :return: seconds to defer message, 0 to dispatch now, None to drop
+        """
+        sender = data.get('sender') or {}
+        senderId = sender.get('id')
+        if senderId in self.allow:
+            return 0.0
+        group = sender.get('group')
+        now = time.monotonic()
+
+        taken: list[TokenBucket] = []
+        delay = 0.0
+        if self.senderRate is not None and senderId is not None:
+            bucket = self._bucket(self._senders, senderId, now, self.senderRate,
+                                  self.senderBurst)
+            delay = bucket.wait(self.senderRate)
+            taken.append(bucket)
+        if self.groupRate is not None and group:
+            bucket = self._bucket(self._groups, group.get('id'), now, self.groupRate,
+                                  self.groupBurst)
+            delay = max(delay, bucket.wait(self.groupRate))
+            taken.append(bucket)
+
+        if delay and (self.mode == 'drop' or delay > self.maxDelay):
+            self.dropped += 1
+            return None
+        for bucket in taken:
+            bucket.tokens -= 1
+        if delay: self.deferred += 1
+        return delay
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Literal, Optional, Union
+
+from .transport import Transport, TransportClosed
+
+logger = logging.getLogger(__name__)
+
+# commands without subCommand which are GET in HTTP adapter
+GET_COMMANDS = {
+    'about',
+    'botList',
+    'messageFromId',
+    'friendList',
+    'groupList',
+    'memberList',
+    'botProfile',
+    'friendProfile',
+    'memberProfile',
+    'userProfile',
+    'sessionInfo',
+    'fetchMessage',
+    'fetchLatestMessage',
+    'peekMessage',
+    'peekLatestMessage',
+    'countMessage',
+    'file_list',
+    'file_info',
+    'anno_list',
+}
+
+
+def _aiohttp() -> Any:
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError(
+            "HTTP adapter need aiohttp, install by `pip install madoka[http]`"
+        ) from None
+    return aiohttp
+
+
+class HttpAdapter:
+    """
+    issue API commands to mirai-api-http HTTP adapter
+    over a pool of keep-alive connections
+    """
+    def __init__(
+        self,
+        host: str,
+        protocol: Literal['http', 'https'] = 'http',
+        connections: int = 4,
+        timeout: float = 60,
+    ) -> None:
+        """
+        :connections: max connections in pool, also max commands in flight
+        :timeout: seconds for each command
+        """
+        self.url = f"{protocol}://{host}"
+        self.connections = connections
+        self.timeout = timeout
+        self.session: Optional[str] = None
+        self._client: Any = None
+
+    async def open(self, session: Optional[str] = None) -> None:
+        """
+        :session: sessionKey got from other adapter, share it
+        """
+        if session is not None:
+            self.session = session
+        if self._client is not None:
+            return
+        aiohttp = _aiohttp()
+        self._client = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.connections,
+                keepalive_timeout=60,
+            ),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            json_serialize=json.dumps,
+        )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    def request(
+        self,
+        command: str,
+        subCommand: Optional[str],
+        content: str,
+    ) -> asyncio.Future[dict[str, Any]]:
+        """
+        :content: serialized json object
+        """
+        return asyncio.ensure_future(self._request(command, subCommand, content))
+
+    async def _request(
+        self,
+        command: str,
+        subCommand: Optional[str],
+        content: str,
+    ) -> dict[str, Any]:
+        url = f"{self.url}/{command.replace('_', '/')}"
+        headers = {'sessionKey': self.session} if self.session else {}
+        if subCommand == 'get' or (subCommand is None and command in GET_COMMANDS):
+            params = {k: str(v) for k, v in json.loads(content).items()}
+            if self.session: params['sessionKey'] = self.session
+            async with self._client.get(url, params=params, headers=headers) as resp:
+                return await resp.json(loads=json.loads, content_type=None)
+        else:
+            if self.session:
+                key = json.dumps(self.session)
+                if content.strip() == '{}':
+                    content = f'{{"sessionKey": {key}}}'
+                else:
+                    content = f'{{"sessionKey": {key}, {content.lstrip()[1:]}'
+            headers['Content-Type'] = 'application/json'
+            async with self._client.post(url, data=content, headers=headers) as resp:
+                return await resp.json(loads=json.loads, content_type=None)
+
+    async def upload(
+        self,
+        command: str,
+        fields: dict[str, Union[str, bytes]],
+    ) -> dict[str, Any]:
+        """
+        multipart upload, bytes fields are sent as file
+        """
+        aiohttp = _aiohttp()
+        form = aiohttp.FormData()
+        if self.session: form.add_field('sessionKey', self.session)
+        for name, value in fields.items():
+            if isinstance(value, bytes):
+                form.add_field(name, value, filename=name)
+            else:
+                form.add_field(name, value)
+        url = f"{self.url}/{command.replace('_', '/')}"
+        headers = {'sessionKey': self.session} if self.session else {}
+        async with self._client.post(url, data=form, headers=headers) as resp:
+            return await resp.json(loads=json.loads, content_type=None)
+
+
+class HttpPollTransport(Transport):
+    """
+    receive messages and events by polling `fetchMessage` of HTTP adapter
+    send commands through the same adapter
+    """
+    def __init__(
+        self,
+        adapter: HttpAdapter,
+        verifyKey: str,
+        qid: int,
+        interval: float = 0.5,
+        count: int = 100,
+        reservedSyncId: str = '-1',
+    ) -> None:
+        """
+        :interval: seconds between polls when nothing fetched
+        :count: max messages fetched once
+        """
+        self.adapter = adapter
+        self.verifyKey = verifyKey
+        self.qid = qid
+        self.interval = interval
+        self.count = count
+        self.reservedSyncId = reservedSyncId
+
+    async def connect(self) -> None:
+        await self.adapter.open()
+        resp = await self.adapter._request(
+            'verify', None, json.dumps({'verifyKey': self.verifyKey}))
+        if resp.get('code') != 0:
+            raise RuntimeError(f"verify failed: {resp}")
+        self.adapter.session = resp['session']
+        resp = await self.adapter._request('bind', None, json.dumps({'qq': self.qid}))
+        if resp.get('code') != 0:
+            raise RuntimeError(f"bind failed: {resp}")
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._queue.put_nowait(json.dumps({
+            'syncId': '',
+            'data': {
+                'code': 0,
+                'session': self.adapter.session
+            },
+        }))
+
+    async def recv(self) -> str:
+        while self._queue.empty():
+            try:
+                resp = await self.adapter._request(
+                    'fetchMessage', None, json.dumps({'count': self.count}))
+            except Exception as e:
+                raise TransportClosed(f"poll failed: {e!r}") from e
+            if resp.get('code') != 0:
+                raise TransportClosed(f"poll failed: {resp}")
+            for data in resp['data']:
+                self._queue.put_nowait(json.dumps({
+                    'syncId': self.reservedSyncId,
+                    'data': data,
+                }))
+            if self._queue.empty():
+                await asyncio.sleep(self.interval)
+        return self._queue.get_nowait()
+
+    async def send(self, data: str) -> None:
+        req = json.loads(data)
+        resp = await self.adapter._request(
+            req['command'], req.get('subCommand'), json.dumps(req['content']))
+        self._queue.put_nowait(json.dumps({'syncId': req['syncId'], 'data': resp}))
+
+    async def close(self) -> None:
+        try:
+            await self.adapter._request('release', None, json.dumps({'qq': self.qid}))
+        except Exception:
+            logger.debug("release session failed")
+        await self.adapter.close()
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import os
+from typing import Optional, Union
+
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+ImageSource = Union[str, bytes]
+
+
+def readImage(image: ImageSource) -> tuple[bytes, str]:
+    """
+    blocking, run it in executor
+    :return: content and its sha256
+    """
+    if isinstance(image, str):
+        with open(image, 'rb') as fp:
+            image = fp.read()
+    import hashlib
+
+    return image, hashlib.sha256(image).hexdigest()
+
+
+def encodeImage(image: bytes) -> str:
+    """
+    blocking, run it in executor
+    """
+    return base64.b64encode(image).decode()
+
+
+class ImageCache:
+    """
+    imageId of uploaded images keyed by content hash and upload type
+    """
+    def __init__(self, maxsize: int = 4096, path: Optional[str] = None) -> None:
+        """
+        :path: json file to persist, loaded if exists
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._cache: LRUCache[str, str] = LRUCache(maxsize=maxsize)
+        self._dirty = False
+        self._saving: Optional[asyncio.Task] = None
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as fp:
+                    self._cache.update(json.load(fp))
+            except (OSError, ValueError):
+                logger.exception(f"load image cache failed: {path}")
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def get(self, digest: str, type: str) -> Optional[str]:
+        imageId = self._cache.get(f"{type}:{digest}")
+        if imageId is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return imageId
+
+    def put(self, digest: str, type: str, imageId: str) -> None:
+        self._cache[f"{type}:{digest}"] = imageId
+
+    def save(self, data: Optional[dict[str, str]] = None) -> None:
+        """
+        blocking, run it in executor with `data` snapshot taken in event loop
+        """
+        if not self.path: return
+        if data is None: data = dict(self._cache.items())
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(data, fp)
+        os.replace(tmp, self.path)
+
+    def scheduleSave(self) -> None:
+        """
+        save in executor, one at a time, changes during a save are saved next
+        """
+        if not self.path: return
+        self._dirty = True
+        if self._saving is None or self._saving.done():
+            self._saving = asyncio.create_task(self._saveLoop())
+
+    async def _saveLoop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._dirty:
+            self._dirty = False
+            data = dict(self._cache.items())
+            try:
+                await loop.run_in_executor(None, self.save, data)
+            except OSError:
+                logger.exception(f"save image cache failed: {self.path}")
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Optional
+
+from ..typing import Chain
+
+MAX_NODES = 100
+MAX_SIZE = 256 * 1024
+
+
+class ForwardPacker:
+    """
+    pack messageChains into forward messages
+    start a new forward message when node count or serialized size exceeded
+    """
+    def __init__(
+        self,
+        senderId: int,
+        senderName: str,
+        numero: bool = True,
+        maxNodes: int = MAX_NODES,
+        maxSize: int = MAX_SIZE,
+    ) -> None:
+        self.senderId = senderId
+        self.senderName = senderName
+        self.numero = numero
+        self.maxNodes = maxNodes
+        self.maxSize = maxSize
+        self._cnt = 0
+        self._nodes: list[dict[str, Any]] = []
+        self._size = 0
+        self._time = int(time.time())
+
+    def add(self, chain: list[dict[str, Any]]) -> Optional[Chain]:
+        """
+        :return: the forward messageChain which is full, or None
+        """
+        self._cnt += 1
+        name = self.senderName
+        if self.numero:
+            name += f" - {self._cnt}"
+        node = {
+            'senderId': self.senderId,
+            'time': self._time,
+            'senderName': name,
+            'messageChain': chain,
+            'messageId': None,
+        }
+        size = len(json.dumps(node))
+
+        ret = None
+        if self._nodes and (len(self._nodes) >= self.maxNodes
+                            or self._size + size > self.maxSize):
+            ret = self.flush()
+        self._nodes.append(node)
+        self._size += size
+        return ret
+
+    def flush(self) -> Optional[Chain]:
+        """
+        :return: the forward messageChain of remaining nodes, or None
+        """
+        if not self._nodes:
+            return None
+        chain = Chain().add('Forward', nodeList=self._nodes)
+        self._nodes = []
+        self._size = 0
+        self._time = int(time.time())
+        return chain
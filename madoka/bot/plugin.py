@@ -0,0 +1,274 @@
+"""
+plugin module declares `plugin = Plugin()` and registers on it
+instead of bot, then `bot.usePlugin('module.name', ...)`
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import inspect
+import logging
+import sys
+import time
+from datetime import datetime
+from itertools import count, repeat
+from types import ModuleType
+from typing import (TYPE_CHECKING, Any, Callable, Iterable, Iterator, Optional,
+                    Type)
+
+if TYPE_CHECKING:
+    from ..typing import Context, Event
+    from .bot import QQbot
+    from .schedule import Task, timed, timedFuncGen, timedFuncWrap
+    from .solve import (ctxCensor, ctxFunc, ctxFuncGen, ctxFuncWrap, eventFunc,
+                        eventFuncGen, eventFuncWrap)
+
+logger = logging.getLogger(__name__)
+
+
+class Plugin:
+    """
+    record registrations, applied to bot when the plugin is loaded
+    """
+    def __init__(self, name: Optional[str] = None) -> None:
+        self.name = name
+        self._functions: list[tuple[ctxFuncGen, Optional[ctxCensor], Optional[float]]] = []
+        self._events: list[tuple[Type[Event], eventFuncGen, Optional[float]]] = []
+        self._timed: list[tuple[Callable[[], Iterator[timed]], timedFuncGen,
+                                Optional[float]]] = []
+
+    def addFunction(
+        self,
+        check: Optional[ctxCensor] = None,
+        timeout: Optional[float] = None,
+    ) -> ctxFuncWrap:
+        def wrapper(func: ctxFuncGen) -> ctxFuncGen:
+            self._functions.append((func, check, timeout))
+            return func
+
+        return wrapper
+
+    def addEvent(
+        self,
+        event: Type[Event],
+        timeout: Optional[float] = None,
+    ) -> eventFuncWrap:
+        def wrapper(func: eventFuncGen) -> eventFuncGen:
+            self._events.append((event, func, timeout))
+            return func
+
+        return wrapper
+
+    def runOnce(
+        self,
+        delay: int = 0,
+        timeout: Optional[float] = None,
+    ) -> timedFuncWrap:
+        """
+        delay is counted from loading
+        """
+        return self.addTimed(lambda: repeat(time.time() + delay, 1), timeout)
+
+    def runRepect(
+        self,
+        interval: int = 0,
+        delay: int = 0,
+        timeout: Optional[float] = None,
+    ) -> timedFuncWrap:
+        return self.addTimed(lambda: count(time.time() + delay, interval), timeout)
+
+    def runCron(
+        self,
+        cron: str,
+        timeout: Optional[float] = None,
+    ) -> timedFuncWrap:
+        def it() -> Iterator[timed]:
+            from croniter.croniter import croniter
+
+            return croniter(cron, start_time=datetime.today(), ret_type=datetime)
+
+        return self.addTimed(it, timeout)
+
+    def addTimed(
+        self,
+        it: Callable[[], Iterator[timed]],
+        timeout: Optional[float] = None,
+    ) -> timedFuncWrap:
+        """
+        :it: called when loading, return iter of Task datetime or timestamp
+        """
+        def wrapper(func: timedFuncGen) -> timedFuncGen:
+            self._timed.append((it, func, timeout))
+            return func
+
+        return wrapper
+
+
+class PluginRef:
+    """
+    a plugin module used by bot, loaded or not
+    """
+    def __init__(
+        self,
+        module: str,
+        types: Optional[Iterable[str]],
+        prefixes: Optional[Iterable[str]],
+    ) -> None:
+        self.module = module
+        self.types = frozenset(types) if types is not None else None
+        self.prefixes = tuple(prefixes) if prefixes is not None else None
+        self.plugins: list[Plugin] = []
+        self.loaded = False
+        self.stub: Optional[ctxFunc] = None
+        self._functions: list[ctxFunc] = []
+        self._events: list[tuple[Type[Event], eventFunc]] = []
+        self._tasks: list[Task] = []
+
+    def match(self, ctx: Context) -> bool:
+        if self.types is not None and ctx.type not in self.types:
+            return False
+        if self.prefixes is not None and not ctx.text.lstrip().startswith(self.prefixes):
+            return False
+        return True
+
+
+class PluginManager:
+    def __init__(self, bot: QQbot) -> None:
+        self._bot = bot
+        self.refs: dict[str, PluginRef] = {}
+
+    def use(
+        self,
+        module: str,
+        types: Optional[Iterable[str]] = None,
+        prefixes: Optional[Iterable[str]] = None,
+        lazy: bool = True,
+    ) -> PluginRef:
+        if module in self.refs:
+            raise ValueError(f"plugin {module} is already used")
+        ref = PluginRef(module, types, prefixes)
+        self.refs[module] = ref
+        if lazy and (types is not None or prefixes is not None):
+            self._arm(ref)
+        else:
+            self.load(module)
+        return ref
+
+    def _arm(self, ref: PluginRef) -> None:
+        """
+        import the module on first matching message, then dispatch it
+        messages dispatched before loading and still running the stub
+        are passed to the plugin too, they miss its handlers otherwise
+        """
+        from .solve import REJECTED
+
+        def stub(bot: QQbot, ctx: Context) -> Any:
+            if self.refs.get(ref.module) is not ref:
+                return REJECTED  # unloaded
+            if not ref.loaded:
+                if not ref.match(ctx): return REJECTED
+                self.load(ref.module)
+            rets = [func(bot, ctx) for func in list(ref._functions)]
+            waits = [ret for ret in rets if inspect.isawaitable(ret)]
+            if waits:
+                return asyncio.gather(*waits)
+
+        stub.__name__ = f"plugin:{ref.module}"
+        ref.stub = stub
+        self._bot._ctxLst.append(stub)
+
+    def _disarm(self, ref: PluginRef) -> None:
+        if ref.stub is not None:
+            if ref.stub in self._bot._ctxLst:
+                self._bot._ctxLst.remove(ref.stub)
+            ref.stub = None
+
+    def load(self, module: str) -> PluginRef:
+        """
+        the lazy stub is kept if importing fails, and tried again on next message
+        """
+        ref = self.refs[module]
+        if ref.loaded: return ref
+        start = time.perf_counter()
+        mod = _import(module)
+        self._disarm(ref)
+        self._install(ref, mod)
+        logger.info(f"plugin {module} loaded in {time.perf_counter() - start:.3f}s")
+        return ref
+
+    def _install(self, ref: PluginRef, mod: ModuleType) -> None:
+        ref.plugins = _plugins(mod)
+        for plugin in ref.plugins:
+            self._attach(ref, plugin)
+        ref.loaded = True
+
+    def _attach(self, ref: PluginRef, plugin: Plugin) -> None:
+        bot = self._bot
+        for func, check, timeout in plugin._functions:
+            bot.addFunction(check, timeout)(func)
+            ref._functions.append(bot._ctxLst[-1])
+        for event, efunc, timeout in plugin._events:
+            bot.addEvent(event, timeout)(efunc)
+            ref._events.append((event, efunc))
+        for it, tfunc, timeout in plugin._timed:
+            bot.addTimed(it(), timeout)(tfunc)
+            ref._tasks.append(bot._timedLst[-1])
+
+    def unload(self, module: str) -> PluginRef:
+        """
+        remove handlers and timed tasks, running ones are not cancelled
+        """
+        ref = self.refs.pop(module)
+        self._disarm(ref)
+        self._detach(ref)
+        return ref
+
+    def _detach(self, ref: PluginRef) -> None:
+        bot = self._bot
+        for func in ref._functions:
+            if func in bot._ctxLst: bot._ctxLst.remove(func)
+            bot._timeouts.pop(func, None)
+        for event, efunc in ref._events:
+            funcs = bot._eventLst.get(event, [])
+            if efunc in funcs: funcs.remove(efunc)
+            bot._timeouts.pop(efunc, None)
+        for task in ref._tasks:
+            task.cancelled = True
+        # Task compares by time, filter by flag instead of `remove`
+        bot._timedLst[:] = [task for task in bot._timedLst if not task.cancelled]
+        ref._functions.clear()
+        ref._events.clear()
+        ref._tasks.clear()
+        ref.plugins = []
+        ref.loaded = False
+
+    def reload(self, module: str) -> PluginRef:
+        """
+        reimport a loaded plugin, or wait for next matching message if still lazy
+        old handlers are kept if importing fails
+        """
+        ref = self.refs[module]
+        if not ref.loaded:
+            if ref.stub is not None: return ref
+            return self.load(module)
+        start = time.perf_counter()
+        mod = _import(module)
+        self._detach(ref)
+        self._install(ref, mod)
+        logger.info(f"plugin {module} reloaded in {time.perf_counter() - start:.3f}s")
+        return ref
+
+
+def _import(module: str) -> ModuleType:
+    if module in sys.modules:
+        return importlib.reload(sys.modules[module])
+    return importlib.import_module(module)
+
+
+def _plugins(module: ModuleType) -> list[Plugin]:
+    plugins = [v for v in vars(module).values() if isinstance(v, Plugin)]
+    if not plugins:
+        logger.warning(f"no Plugin in module {module.__name__}")
+    for plugin in plugins:
+        if plugin.name is None: plugin.name = module.__name__
+    return plugins
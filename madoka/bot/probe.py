@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Any, Literal, Optional
+
+from .. import metrics
+
+if TYPE_CHECKING:
+    from .base import BotBase
+
+logger = logging.getLogger(__name__)
+
+rttSeconds = metrics.registry.gauge(
+    'madoka_rtt_seconds',
+    'Smoothed round trip time of probe command',
+    ('qid', ),
+)
+jitterSeconds = metrics.registry.gauge(
+    'madoka_rtt_jitter_seconds',
+    'Smoothed deviation of probe round trip time',
+    ('qid', ),
+)
+reconnects = metrics.registry.counter(
+    'madoka_reconnects_total',
+    'Reconnects triggered by failed probes',
+    ('qid', ),
+)
+
+Status = Literal['ok', 'degraded', 'down']
+
+
+class LatencyProbe:
+    """
+    periodically send a cheap command on the connection
+    rtt and jitter are smoothed as TCP does (RFC 6298)
+    """
+    def __init__(
+        self,
+        bot: BotBase,
+        interval: float = 30,
+        command: str = 'about',
+        failures: int = 2,
+        minTimeout: float = 5,
+        maxTimeout: float = 60,
+        multiplier: float = 4,
+        degraded: float = 1,
+    ) -> None:
+        """
+        :interval: seconds between probes
+        :failures: consecutive failed probes before reconnect
+        :minTimeout: lower bound of adaptive response timeout
+        :maxTimeout: response timeout before the first sample, and upper bound
+        :multiplier: response timeout is `multiplier` times probe timeout
+        :degraded: seconds of smoothed rtt reported as degraded
+        """
+        self._bot = bot
+        self.interval = interval
+        self.command = command
+        self.failures = failures
+        self.minTimeout = minTimeout
+        self.maxTimeout = maxTimeout
+        self.multiplier = multiplier
+        self.degraded = degraded
+        self.srtt: Optional[float] = None
+        self.rttvar = 0.0
+        self.samples = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self.lastProbe: Optional[float] = None
+
+    def observe(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.samples += 1
+        self.failed = 0
+
+    @property
+    def probeTimeout(self) -> float:
+        """
+        seconds before a probe is considered failed
+        """
+        if self.srtt is None: return self.maxTimeout
+        return min(max(self.srtt + 4 * self.rttvar, 1.0), self.maxTimeout)
+
+    @property
+    def responseTimeout(self) -> float:
+        """
+        seconds before a pending API response is failed with TimeoutError
+        """
+        if self.srtt is None: return self.maxTimeout
+        timeout = self.multiplier * (self.srtt + 4 * self.rttvar)
+        return min(max(timeout, self.minTimeout), self.maxTimeout)
+
+    @property
+    def status(self) -> Status:
+        if self.failed >= self.failures:
+            return 'down'
+        if self.failed or self.srtt is not None and self.srtt > self.degraded:
+            return 'degraded'
+        return 'ok'
+
+    def health(self) -> dict[str, Any]:
+        return {
+            'status': self.status,
+            'rtt': self.srtt,
+            'jitter': self.rttvar,
+            'timeout': self.responseTimeout,
+            'lastProbe': None if self.lastProbe is None else time.monotonic() - self.lastProbe,
+            'samples': self.samples,
+            'failures': self.failed,
+            'timeouts': self.timeouts,
+            'reconnects': self.reconnects,
+        }
+
+    async def probe(self) -> Optional[float]:
+        """
+        :return: rtt, None if failed
+        """
+        start = time.perf_counter()
+        self.lastProbe = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                self._bot.send(self.command, None, {}),
+                self.probeTimeout,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"probe failed {self.failed}/{self.failures}: {e!r}")
+            return None
+        rtt = time.perf_counter() - start
+        self.observe(rtt)
+        return rtt
+
+    async def run(self) -> None:
+        qid = str(self._bot.qid)
+        rttSeconds.setFunction(lambda: self.srtt or 0.0, qid)
+        jitterSeconds.setFunction(lambda: self.rttvar, qid)
+        logger.debug("Start latency probe")
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                if await self.probe() is not None:
+                    continue
+                if self.failed < self.failures:
+                    continue
+                self.reconnects += 1
+                if metrics.registry.enabled:
+                    reconnects.inc(qid)
+                try:
+                    await self._bot.reconnect()
+                except Exception as e:
+                    logger.error(f"reconnect failed: {e!r}")
+                    continue
+                self.failed = 0
+        finally:
+            rttSeconds.remove(qid)
+            jitterSeconds.remove(qid)
@@ -6,12 +6,11 @@ import logging
 import time
 from datetime import datetime
 from itertools import count, repeat
-from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Iterator, TypeVar,
-                    Union)
+from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Iterator, Optional,
+                    TypeVar, Union)
 
-from croniter.croniter import croniter
-
-from .base import BotBase
+from .. import metrics
+from .base import BotBase, HandlerExpired, waitHandler
 
 if TYPE_CHECKING:
     from .bot import QQbot
@@ -32,9 +31,13 @@ class Task:
         self,
         func: timedFunc,
         iter: Iterator[timed],
+        timeout: Optional[float] = None,
     ) -> None:
         self.func = func
         self.iter = iter
+        self.timeout = timeout
+        # removed from schedule, e.g. by unloading plugin
+        self.cancelled = False
         nxt = next(self.iter)
         if isinstance(nxt, datetime):
             self.time: datetime = nxt
@@ -88,26 +91,48 @@ class ScheduleUnit(BotBase):
             self._timeQueue.put_nowait(task)
         return self
 
-    def runOnce(self, delay: int = 0) -> timedFuncWrap:
-        return self.addTimed(repeat(time.time() + delay, 1))
+    def runOnce(
+        self,
+        delay: int = 0,
+        timeout: Optional[float] = None,
+    ) -> timedFuncWrap:
+        return self.addTimed(repeat(time.time() + delay, 1), timeout)
+
+    def runRepect(
+        self,
+        interval: int = 0,
+        delay: int = 0,
+        timeout: Optional[float] = None,
+    ) -> timedFuncWrap:
+        return self.addTimed(count(time.time() + delay, interval), timeout)
 
-    def runRepect(self, interval: int = 0, delay: int = 0) -> timedFuncWrap:
-        return self.addTimed(count(time.time() + delay, interval))
+    def runCron(
+        self,
+        cron: str,
+        timeout: Optional[float] = None,
+    ) -> timedFuncWrap:
+        from croniter.croniter import croniter
 
-    def runCron(self, cron: str) -> timedFuncWrap:
         return self.addTimed(
             croniter(
                 cron,
                 start_time=datetime.today(),
                 ret_type=datetime,
-            ))
+            ),
+            timeout,
+        )
 
-    def addTimed(self, it: Iterator[timed]) -> timedFuncWrap:
+    def addTimed(
+        self,
+        it: Iterator[timed],
+        timeout: Optional[float] = None,
+    ) -> timedFuncWrap:
         """
         :it: iter of Task datetime or timestamp
+        :timeout: seconds before async func is cancelled, default `handlerTimeout`
         """
         def wrapper(func: timedFuncGen) -> timedFuncGen:
-            task = Task(func, it)
+            task = Task(func, it, timeout)
             logger.debug(f"add Task: {task.func.__name__} {task.time}")
             self._timedLst.append(task)
             if hasattr(self, "_timeQueue"):
@@ -118,17 +143,37 @@ class ScheduleUnit(BotBase):
 
     async def _schedule(self) -> None:
         async def solve(task: Task) -> None:
+            start = time.perf_counter()
+            timeout = task.timeout if task.timeout is not None else self.handlerTimeout
             try:
                 ret = task.func(self._bot)
-                if inspect.isawaitable(ret): await ret
+                if inspect.isawaitable(ret):
+                    await waitHandler(ret, timeout)
+            except HandlerExpired:
+                logger.warning(f"schedule module: {task.func.__name__} timeout {timeout}s")
+                if metrics.registry.enabled:
+                    metrics.handlerTimeouts.inc(task.func.__name__)
             except:
                 logger.exception(f"schedule module: {task.func.__name__}")
+                if metrics.registry.enabled:
+                    metrics.handlerErrors.inc(task.func.__name__)
+            finally:
+                if metrics.registry.enabled:
+                    metrics.handlerSeconds.observe(
+                        time.perf_counter() - start,
+                        task.func.__name__,
+                    )
 
         logger.debug(f"Start schedule")
         while True:
             task = await self._timeQueue.get()
-            if task.timestamp <= time.time():
+            if task.cancelled:
+                logger.debug(f"Task cancelled: {task.func.__name__}")
+            elif task.timestamp <= time.time():
                 logger.info(f"Task run: {task.func.__name__}")
+                if metrics.registry.enabled:
+                    metrics.scheduleLag.observe(time.time() - task.timestamp)
+                    metrics.scheduleRuns.inc(task.func.__name__)
                 asyncio.create_task(solve(task))
                 try:
                     self._timeQueue.put_nowait(task.next())
@@ -3,12 +3,18 @@ from __future__ import annotations
 import asyncio
 import inspect
 import logging
+import time
 from contextvars import ContextVar
-from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Optional, Type,
-                    TypeVar, Union)
+from functools import wraps
+from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Hashable,
+                    Literal, Optional, Type, TypeVar, Union)
 
-from ..typing import Context, Event
-from .base import BotBase
+from .. import metrics
+from ..trace import traceStore, tracer
+from ..typing import Context, Event, GroupSender, SourceText, TempSender
+from .base import BotBase, HandlerExpired, waitHandler
+from .dedup import DedupWindow
+from .flood import FloodLimiter
 
 from pydantic import ValidationError
 
@@ -31,34 +37,208 @@ logger = logging.getLogger(__name__)
 
 contextStore: ContextVar[Context] = ContextVar('context')
 
+# returned by a handler whose censor rejected the message, it did not run
+REJECTED: Any = object()
+
+
+def conversationKey(
+    ctx: Context,
+    scope: Literal['sender', 'group'] = 'sender',
+) -> tuple[Optional[int], Optional[int]]:
+    """
+    (group, sender) of ctx, sender is None if scope is group
+    friend and temp chats are always per sender, group is None for friend
+    """
+    sender = ctx.sender
+    if isinstance(sender, GroupSender):
+        return (sender.group.id, None if scope == 'group' else sender.id)
+    if isinstance(sender, TempSender):
+        return (sender.group.id, sender.id)
+    return (None, sender.id)
+
+
+def groupKey(ctx: Context) -> tuple[Optional[int], Optional[int]]:
+    return conversationKey(ctx, 'group')
+
+
+class Waiter:
+    __slots__ = ('check', 'future', 'consume')
+
+    def __init__(
+        self,
+        check: Optional[ctxCensor],
+        future: asyncio.Future[Context],
+        consume: bool,
+    ) -> None:
+        self.check = check
+        self.future = future
+        self.consume = consume
+
 
 class SolveUnit(BotBase):
     _ctxLst: list[ctxFunc]
     _eventLst: dict[Type[Event], list[eventFunc]]
+    _dedup: Optional[DedupWindow]
+    _flood: Optional[FloodLimiter]
+    # keyed by (key function, key)
+    _waiters: dict[tuple[Callable[[Context], Hashable], Hashable], list[Waiter]]
+    _timeouts: dict[Callable, float]
+    # seconds all handlers of one message may take, then the rest are cancelled
+    messageBudget: Optional[float] = None
 
     def __new__(cls, *args, **kwargs) -> Any:
         obj = super().__new__(cls)
         obj._ctxLst = []
         obj._eventLst = {}
+        obj._dedup = None
+        obj._flood = None
+        obj._waiters = {}
+        obj._timeouts = {}
         return obj
 
-    def addFunction(self, check: Optional[ctxCensor] = None) -> ctxFuncWrap:
+    def enableDedup(self, window: float = 120, maxsize: int = 65536) -> DedupWindow:
+        """
+        drop replayed messages before parsing
+        keyed on messageId with sender and group
+        """
+        self._dedup = DedupWindow(window, maxsize)
+        return self._dedup
+
+    def enableFloodControl(
+        self,
+        senderRate: Optional[float] = 1,
+        senderBurst: float = 5,
+        groupRate: Optional[float] = 5,
+        groupBurst: float = 20,
+        mode: Literal['drop', 'defer'] = 'drop',
+        maxDelay: float = 10,
+    ) -> FloodLimiter:
+        """
+        limit messages per sender and per group before parsing
+        `adminQid` is never limited, add more to `allow` of the limiter
+        """
+        self._flood = FloodLimiter(
+            senderRate,
+            senderBurst,
+            groupRate,
+            groupBurst,
+            allow=() if self.adminQid is None else (self.adminQid, ),
+            mode=mode,
+            maxDelay=maxDelay,
+        )
+        return self._flood
+
+    def addFunction(
+        self,
+        check: Optional[ctxCensor] = None,
+        timeout: Optional[float] = None,
+    ) -> ctxFuncWrap:
+        """
+        :timeout: seconds before async func is cancelled, default `handlerTimeout`
+        """
         def wrapper(func: ctxFuncGen) -> ctxFuncGen:
+            @wraps(func)
             def inner(bot: QQbot, context: Context) -> Ret:
-                if check(bot, context):  # type: ignore
+                trace = traceStore.get()
+                if trace is None:
+                    passed = check(bot, context)  # type: ignore
+                else:
+                    with trace.span('censor', func=func.__name__) as span:
+                        passed = check(bot, context)  # type: ignore
+                        span.attrs['passed'] = bool(passed)
+                if passed:
                     return func(bot, context)
+                if metrics.registry.enabled:
+                    metrics.filterRejections.inc(func.__name__)
+                return REJECTED
 
             if not check:
                 self._ctxLst.append(func)
+                if timeout is not None: self._timeouts[func] = timeout
             else:
                 self._ctxLst.append(inner)
+                if timeout is not None: self._timeouts[inner] = timeout
             return func
 
         return wrapper
 
-    def addEvent(self, event: Type[Event]) -> eventFuncWrap:
+    async def waitFor(
+        self,
+        check: Optional[ctxCensor] = None,
+        timeout: Optional[float] = 60,
+        key: Optional[Hashable] = None,
+        scope: Literal['sender', 'group'] = 'sender',
+        consume: bool = True,
+        keyFunc: Optional[Callable[[Context], Hashable]] = None,
+    ) -> Optional[Context]:
+        """
+        wait for next message in a conversation which pass check
+        :key: default is current conversation, see `conversationKey`
+        :scope: conversation is the sender (in group), or the whole group
+        :consume: the message is not dispatched to `addFunction` handlers
+        :keyFunc: key of incoming messages, compared with key
+        :return: None if timeout
+        """
+        if keyFunc is None:
+            if key is not None:
+                if not (isinstance(key, tuple) and len(key) == 2):
+                    raise TypeError(f"key should be (group, sender), or give keyFunc: {key!r}")
+                keyFunc = groupKey if key[1] is None else conversationKey
+            else:
+                keyFunc = groupKey if scope == 'group' else conversationKey
+        if key is None:
+            ctx = contextStore.get(None)
+            if ctx is None:
+                raise RuntimeError("Unable to known conversation")
+            key = keyFunc(ctx)
+        key = (keyFunc, key)
+        waiter = Waiter(check, asyncio.get_running_loop().create_future(), consume)
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                if waiter in waiters: waiters.remove(waiter)
+                if not waiters: del self._waiters[key]
+
+    def _wake(self, ctx: Context) -> bool:
+        """
+        :return: ctx is consumed by a waiter
+        """
+        keyFuncs = {keyFunc for keyFunc, _ in self._waiters}
+        for keyFunc in keyFuncs:
+            try:
+                k = (keyFunc, keyFunc(ctx))
+            except Exception:
+                logger.exception(f"waitFor keyFunc={keyFunc.__name__}")
+                continue
+            for waiter in self._waiters.get(k, ()):
+                if waiter.future.done():
+                    continue
+                try:
+                    if waiter.check and not waiter.check(self._bot, ctx):
+                        continue
+                except Exception as e:
+                    waiter.future.set_exception(e)
+                    continue
+                waiter.future.set_result(ctx)
+                return waiter.consume
+        return False
+
+    def addEvent(
+        self,
+        event: Type[Event],
+        timeout: Optional[float] = None,
+    ) -> eventFuncWrap:
+        """
+        :timeout: seconds before async func is cancelled, default `handlerTimeout`
+        """
         def wrapper(func: eventFuncGen) -> eventFuncGen:
             self._eventLst.setdefault(event, []).append(func)
+            if timeout is not None: self._timeouts[func] = timeout
             return func
 
         return wrapper
@@ -67,35 +247,122 @@ class SolveUnit(BotBase):
         logger.debug("Start solving")
         async for data in self._recv():
             if data['type'][-7:] == "Message":
+                if self._dedup is not None:
+                    key = DedupWindow.messageKey(data)
+                    if key is not None and self._dedup.seen(key):
+                        logger.debug(f"drop duplicate message {key}")
+                        if metrics.registry.enabled:
+                            metrics.duplicates.inc()
+                        continue
+                if self._flood is not None:
+                    delay = self._flood.admit(data)
+                    if delay is None:
+                        if metrics.registry.enabled:
+                            metrics.flooded.inc('drop')
+                        continue
+                    if delay:
+                        if metrics.registry.enabled:
+                            metrics.flooded.inc('defer')
+                        asyncio.get_running_loop().call_later(delay, self._deferCtx, data)
+                        continue
                 asyncio.create_task(self._solveCtx(data))
             else:
                 asyncio.create_task(self._solveEvent(data))
 
+    def _deferCtx(self, data: dict[str, Any]) -> None:
+        asyncio.create_task(self._solveCtx(data))
+
     async def _solveCtx(self, data: dict[str, Any]) -> None:
         async def solve(func: ctxFunc) -> None:
+            start = time.perf_counter()
+            timeout = self._timeouts.get(func, self.handlerTimeout)
+            span = trace.span('handler', func=func.__name__) if trace else None
+            ran = True
             try:
                 ret = func(self._bot, ctx)
-                if inspect.isawaitable(ret): await ret
+                if ret is REJECTED:
+                    ran = False
+                    if span: span.attrs['rejected'] = True
+                elif inspect.isawaitable(ret):
+                    await waitHandler(ret, timeout)
+            except HandlerExpired:
+                logger.warning(f"Context: func={func.__name__} timeout {timeout}s")
+                if span: span.attrs['error'] = 'timeout'
+                if metrics.registry.enabled:
+                    metrics.handlerTimeouts.inc(func.__name__)
+            except asyncio.CancelledError:
+                # only cancel by messageBudget is handled
+                if asyncio.current_task() not in overBudget: raise
+                logger.warning(f"Context: func={func.__name__} out of messageBudget")
+                if span: span.attrs['error'] = 'cancelled'
+                if metrics.registry.enabled:
+                    metrics.handlerTimeouts.inc(func.__name__)
             except:
                 logger.exception(f"Context: func={func.__name__}\n {ctx=}")
+                if span: span.attrs['error'] = 'exception'
+                if metrics.registry.enabled:
+                    metrics.handlerErrors.inc(func.__name__)
+            finally:
+                if span: span.finish()
+                if ran and metrics.registry.enabled:
+                    metrics.handlerSeconds.observe(
+                        time.perf_counter() - start,
+                        func.__name__,
+                    )
 
+        overBudget: set[asyncio.Task] = set()
+        trace = tracer.start(type=data['type'])
         try:
-            ctx = Context.parse_obj(data)
+            if trace is None:
+                ctx = Context.parse_obj(data)
+            else:
+                with trace.span('parse'):
+                    ctx = Context.parse_obj(data)
         except ValidationError as e:
             logger.exception(e.json())
             return
 
+        if metrics.registry.enabled:
+            metrics.messages.inc(ctx.type)
+        source = ctx.get(SourceText)
+        if source: self._bot.messageCache.put(source.id, ctx)
         contextStore.set(ctx)
-        for func in self._ctxLst:
-            asyncio.create_task(solve(func))
+        traceStore.set(trace)
+        if self._waiters and self._wake(ctx):
+            if trace: trace.handled()
+            return
+        tasks = [asyncio.create_task(solve(func)) for func in self._ctxLst]
+        if self.messageBudget is not None and tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.messageBudget)
+            for task in pending:
+                overBudget.add(task)
+                task.cancel()
+        if trace:
+            if tasks: await asyncio.wait(tasks)
+            trace.handled()
 
     async def _solveEvent(self, data: dict[str, Any]) -> None:
         async def solve(func: eventFunc) -> None:
+            start = time.perf_counter()
+            timeout = self._timeouts.get(func, self.handlerTimeout)
             try:
                 ret = func(self._bot, event)
-                if inspect.isawaitable(ret): await ret
+                if inspect.isawaitable(ret):
+                    await waitHandler(ret, timeout)
+            except HandlerExpired:
+                logger.warning(f"Event: func={func.__name__} timeout {timeout}s")
+                if metrics.registry.enabled:
+                    metrics.handlerTimeouts.inc(func.__name__)
             except:
                 logger.exception(f"Event: func={func.__name__}\n {event=}")
+                if metrics.registry.enabled:
+                    metrics.handlerErrors.inc(func.__name__)
+            finally:
+                if metrics.registry.enabled:
+                    metrics.handlerSeconds.observe(
+                        time.perf_counter() - start,
+                        func.__name__,
+                    )
 
         try:
             event = Event.parse_obj(data)
@@ -103,6 +370,9 @@ class SolveUnit(BotBase):
             logger.exception(e.json())
             return
 
+        if metrics.registry.enabled:
+            metrics.events.inc(event.type)
+        self._bot.contacts.update(event)
         for k, v in self._eventLst.items():
             if isinstance(event, k):
                 for func in v:
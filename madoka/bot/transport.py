@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+responderFunc = Callable[[str, Optional[str], Any], Optional[dict[str, Any]]]
+
+
+class TransportClosed(ConnectionError):
+    pass
+
+
+class Transport:
+    """
+    frames between BotBase and mirai-api-http
+    recv raise TransportClosed if broken, EOFError if there are no more frames
+    """
+    async def connect(self) -> None:
+        raise NotImplementedError
+
+    async def recv(self) -> str:
+        raise NotImplementedError
+
+    async def send(self, data: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class WebsocketTransport(Transport):
+    def __init__(self, url: str, waitMirai: Optional[int] = None) -> None:
+        """
+        :waitMirai: times to try connecting, 3 seconds apart
+        """
+        self.url = url
+        self.waitMirai = waitMirai or 1
+
+    async def connect(self) -> None:
+        from websockets.legacy import client
+
+        self._connect = client.Connect(self.url)
+        cnt = 0
+        while not (cnt and cnt == self.waitMirai):
+            try:
+                cnt += 1
+                self._ws = await self._connect
+            except:
+                if self.waitMirai != 1:
+                    logger.debug(f"get api information failed: {cnt} times")
+                if cnt != self.waitMirai:
+                    await asyncio.sleep(3)
+                else:
+                    logger.error("Unable to connect to mirai-api-http")
+                    raise
+            else:
+                if cnt != 1: await asyncio.sleep(3)
+                break
+
+    async def recv(self) -> str:
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            return await self._ws.recv()  # type: ignore
+        except ConnectionClosed as e:
+            raise TransportClosed("websockets connection closed") from e
+
+    async def send(self, data: str) -> None:
+        from websockets.exceptions import ConnectionClosed
+
+        try:
+            await self._ws.send(data)
+        except ConnectionClosed as e:
+            raise TransportClosed("websockets connection closed") from e
+
+    async def close(self) -> None:
+        await self._ws.close()
+
+
+def defaultResponder(command: str, subCommand: Optional[str], content: Any) -> dict[str, Any]:
+    if command.startswith('send') and command.endswith('Message'):
+        return {'code': 0, 'msg': 'success', 'messageId': -1}
+    return {'code': 0, 'msg': ''}
+
+
+class MemoryTransport(Transport):
+    """
+    in-process transport, `feed` frames to bot, read bot frames from `sent`
+    queues are created by `connect`, feed after it
+    """
+    def __init__(
+        self,
+        session: Optional[str] = 'memory',
+        responder: Optional[responderFunc] = defaultResponder,
+        reservedSyncId: str = '-1',
+    ) -> None:
+        """
+        :session: session of handshake frame, None to feed it yourself
+        :responder: answer commands sent by bot, None to answer yourself
+        """
+        self.session = session
+        self.responder = responder
+        self.reservedSyncId = reservedSyncId
+        self._closed = False
+
+    async def connect(self) -> None:
+        self.inbox: asyncio.Queue[Optional[str]] = asyncio.Queue()
+        self.sent: asyncio.Queue[str] = asyncio.Queue()
+        self._closed = False
+        if self.session is not None:
+            self.inbox.put_nowait(json.dumps({
+                'syncId': '',
+                'data': {
+                    'code': 0,
+                    'session': self.session
+                },
+            }))
+
+    def feed(self, data: dict[str, Any], syncId: Optional[str] = None) -> None:
+        """
+        :data: message or event, or response if syncId is given
+        """
+        self.feedRaw(json.dumps({
+            'syncId': self.reservedSyncId if syncId is None else syncId,
+            'data': data,
+        }))
+
+    def feedRaw(self, frame: str) -> None:
+        self.inbox.put_nowait(frame)
+
+    async def recv(self) -> str:
+        if self._closed: raise TransportClosed("memory transport closed")
+        frame = await self.inbox.get()
+        # None is put by `close` to wake up
+        if frame is None: raise TransportClosed("memory transport closed")
+        return frame
+
+    async def send(self, data: str) -> None:
+        if self._closed: raise TransportClosed("memory transport closed")
+        if self.responder is None:
+            self.sent.put_nowait(data)
+            return
+        req = json.loads(data)
+        resp = self.responder(req['command'], req.get('subCommand'), req.get('content'))
+        if resp is not None:
+            self.feed(resp, syncId=req['syncId'])
+
+    async def close(self) -> None:
+        self._closed = True
+        if hasattr(self, 'inbox'): self.inbox.put_nowait(None)
+
+
+class ReplayTransport(MemoryTransport):
+    """
+    replay a JSONL capture as fast as possible, yielding to the loop per frame
+    each line is a received frame, or the `data` of a message / event
+    at the end `finished` is set, responses are received until closed
+    """
+    def __init__(
+        self,
+        path: str,
+        responder: Optional[responderFunc] = defaultResponder,
+        reservedSyncId: str = '-1',
+    ) -> None:
+        super().__init__(None, responder, reservedSyncId)
+        self.path = path
+        self.replayed = 0
+
+    async def connect(self) -> None:
+        await super().connect()
+        self._fp = open(self.path, 'r')
+        self._first = True
+        self.finished = asyncio.Event()
+
+    def _frame(self, line: str) -> str:
+        if '"syncId"' in line[:16]:
+            return line
+        return f'{{"syncId": "{self.reservedSyncId}", "data": {line}}}'
+
+    async def recv(self) -> str:
+        # let handlers of previous frames run
+        await asyncio.sleep(0)
+        if self._closed: raise TransportClosed("replay transport closed")
+        if not self.inbox.empty() or self.finished.is_set():
+            return await super().recv()
+        line = self._fp.readline()
+        while line and not line.strip():
+            line = self._fp.readline()
+        if not line:
+            logger.info(f"replay finished: {self.replayed} frames")
+            self.finished.set()
+            return await super().recv()
+        frame = self._frame(line.strip())
+        if self._first:
+            self._first = False
+            if 'session' not in json.loads(frame)['data']:
+                self.feedRaw(frame)
+                frame = json.dumps({'syncId': '', 'data': {'code': 0, 'session': 'replay'}})
+        self.replayed += 1
+        return frame
+
+    async def close(self) -> None:
+        await super().close()
+        self._fp.close()
+
+
+class RecordTransport(Transport):
+    """
+    wrap a transport, write every received frame into a JSONL capture
+    """
+    def __init__(self, inner: Transport, path: str) -> None:
+        self.inner = inner
+        self.path = path
+
+    async def connect(self) -> None:
+        await self.inner.connect()
+        self._fp = open(self.path, 'a')
+
+    async def recv(self) -> str:
+        frame = await self.inner.recv()
+        self._fp.write(frame.replace('\n', ' ') + '\n')
+        return frame
+
+    async def send(self, data: str) -> None:
+        await self.inner.send(data)
+
+    async def close(self) -> None:
+        await self.inner.close()
+        self._fp.close()
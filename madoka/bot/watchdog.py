@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from types import CodeType, FrameType
+from typing import TYPE_CHECKING, Any, Callable, Optional
+
+from .. import metrics
+
+if TYPE_CHECKING:
+    from .bot import QQbot
+
+logger = logging.getLogger(__name__)
+
+lagSeconds = metrics.registry.histogram(
+    'madoka_loop_lag_seconds',
+    'Event loop lag measured by watchdog',
+)
+blocks = metrics.registry.counter(
+    'madoka_loop_blocks_total',
+    'Event loop blocked longer than watchdog threshold',
+    ('handler', ),
+)
+
+
+class BlockReport:
+    """
+    the event loop was blocked by `handler`
+    """
+    def __init__(
+        self,
+        handler: Optional[Callable[..., Any]],
+        args: dict[str, str],
+        stack: list[str],
+    ) -> None:
+        self.handler = handler
+        self.args = args
+        self.stack = stack
+        self.duration = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.handler.__name__ if self.handler else '<unknown>'
+
+    def __repr__(self) -> str:
+        return f"BlockReport({self.name}, duration={self.duration:.3f}s, args={self.args})"
+
+    def format(self) -> str:
+        return f"{self!r}\n" + ''.join(self.stack)
+
+
+class Watchdog:
+    """
+    measure event loop lag, capture the stack from a side thread when blocked
+    """
+    def __init__(
+        self,
+        bot: QQbot,
+        threshold: float = 0.5,
+        interval: float = 0.1,
+        callback: Optional[Callable[[BlockReport], None]] = None,
+        keep: int = 20,
+    ) -> None:
+        """
+        :threshold: seconds of blocking to report
+        :interval: seconds between heartbeats
+        :callback: called in event loop with each finished report
+        :keep: number of recent reports kept in `reports`
+        """
+        self._bot = bot
+        self.threshold = threshold
+        self.interval = interval
+        self.callback = callback
+        self.lag = 0.0
+        self.maxLag = 0.0
+        self.reports: deque[BlockReport] = deque(maxlen=keep)
+        self._beat = time.monotonic()
+        self._pending: Optional[BlockReport] = None
+        self._stop = threading.Event()
+        self._loopThread = 0
+
+    def _handlers(self) -> dict[CodeType, Callable[..., Any]]:
+        funcs: list[Callable[..., Any]] = list(self._bot._ctxLst)
+        for lst in list(self._bot._eventLst.values()):
+            funcs.extend(lst)
+        funcs.extend(task.func for task in list(self._bot._timedLst))
+        codes = {}
+        for func in funcs:
+            func = inspect.unwrap(func)
+            code = getattr(func, '__code__', None)
+            if code is not None: codes[code] = func
+        return codes
+
+    def _capture(self, frame: FrameType) -> BlockReport:
+        codes = self._handlers()
+        handler = None
+        args: dict[str, str] = {}
+        f: Optional[FrameType] = frame
+        while f is not None:
+            handler = codes.get(f.f_code)
+            if handler is not None:
+                names = f.f_code.co_varnames[:f.f_code.co_argcount]
+                args = {
+                    name: repr(f.f_locals.get(name))[:500]
+                    for name in names if name != 'bot'
+                }
+                break
+            f = f.f_back
+        return BlockReport(handler, args, traceback.format_stack(frame))
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            if self._pending is not None:
+                continue
+            if time.monotonic() - self._beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loopThread)
+            if frame is not None:
+                self._pending = self._capture(frame)
+
+    def _finish(self, lag: float) -> None:
+        report, self._pending = self._pending, None
+        if report is None: return
+        report.duration = lag
+        self.reports.append(report)
+        if metrics.registry.enabled:
+            blocks.inc(report.name)
+        logger.warning(f"Event loop blocked: {report.format()}")
+        if self.callback:
+            try:
+                self.callback(report)
+            except:
+                logger.exception("watchdog callback")
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._loopThread = threading.get_ident()
+        self._stop.clear()
+        thread = threading.Thread(target=self._watch, name='madoka-watchdog', daemon=True)
+        thread.start()
+        logger.debug("Start watchdog")
+        try:
+            while True:
+                self._beat = time.monotonic()
+                start = loop.time()
+                await asyncio.sleep(self.interval)
+                self.lag = max(loop.time() - start - self.interval, 0.0)
+                self.maxLag = max(self.maxLag, self.lag)
+                if metrics.registry.enabled:
+                    lagSeconds.observe(self.lag)
+                if self._pending is not None:
+                    self._finish(self.lag)
+        finally:
+            self._stop.set()
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
 import re
-from typing import TYPE_CHECKING, Callable, Type, Union
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, Iterable, Type, Union
 
+from .keyword import Automaton
 from .typing import AtText, Context, GroupSender, TempSender, Text
 
 if TYPE_CHECKING:
@@ -65,6 +67,16 @@ def isAdminCheck(bot: QQbot, ctx: Context) -> bool:
 isAdmin = Censor(isAdminCheck)
 
 
+def isFriendCheck(bot: QQbot, ctx: Context) -> bool:
+    """
+    use cached friend list, need `loadContacts` or `friendList` first
+    """
+    return bot.contacts.isFriend(ctx.sender.id)
+
+
+isFriend = Censor(isFriendCheck)
+
+
 def isPerson(id: int | list[int]) -> Censor:
     _id = [id] if isinstance(id, int) else id
 
@@ -177,3 +189,41 @@ def isText(regExp: str) -> Censor:
         return False
 
     return Censor(check)
+
+
+keywordHits: ContextVar[list[str]] = ContextVar('keywordHits', default=[])
+
+
+class KeywordCensor(Censor):
+    """
+    pass if text contains any of the keywords
+    hit keywords of the last check are in `keywordHits`
+    """
+    def __init__(self, words: Iterable[str], ignoreCase: bool = False) -> None:
+        super().__init__(self._check)
+        self.ignoreCase = ignoreCase
+        self.reload(words)
+
+    def reload(self, words: Iterable[str]) -> None:
+        """
+        build a new automaton then swap, checks in progress are not affected
+        """
+        if self.ignoreCase:
+            words = (word.casefold() for word in words)
+        self.automaton = Automaton(words)
+
+    def find(self, text: str) -> list[str]:
+        if self.ignoreCase: text = text.casefold()
+        return self.automaton.find(text)
+
+    def _check(self, bot: QQbot, ctx: Context) -> bool:
+        hits = self.find(ctx.text)
+        keywordHits.set(hits)
+        return bool(hits)
+
+
+def containsAny(words: Iterable[str], ignoreCase: bool = False) -> KeywordCensor:
+    """
+    use Aho-Corasick automaton, linear in length of text
+    """
+    return KeywordCensor(words, ignoreCase)
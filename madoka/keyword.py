@@ -0,0 +1,77 @@
+"""
+Aho-Corasick automaton, match thousands of keywords in one pass
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import Iterable, Iterator
+
+
+class Automaton:
+    """
+    immutable once built, build a new one to change keywords
+    """
+    __slots__ = ('words', '_goto', '_fail', '_out')
+
+    def __init__(self, words: Iterable[str]) -> None:
+        self.words = frozenset(word for word in words if word)
+        goto: list[dict[str, int]] = [{}]
+        out: list[tuple[str, ...]] = [()]
+        for word in self.words:
+            state = 0
+            for char in word:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    out.append(())
+                state = nxt
+            out[state] = (word, )
+
+        # breadth first, fail of a state is known before its children
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(char, 0)
+                fail[nxt] = target if target != nxt else 0
+                out[nxt] = out[nxt] + out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def iter(self, text: str) -> Iterator[tuple[int, str]]:
+        """
+        yield (end, word) of every occurrence, text[end - len(word):end] == word
+        """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for word in out[state]:
+                yield i + 1, word
+
+    def search(self, text: str) -> bool:
+        for _ in self.iter(text):
+            return True
+        return False
+
+    def find(self, text: str) -> list[str]:
+        """
+        distinct words in text, in order of first occurrence
+        """
+        return list(dict.fromkeys(word for _, word in self.iter(text)))
@@ -0,0 +1,113 @@
+"""
+lazy payload logging for hot paths, and logging off the event loop
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+
+class PayloadLog:
+    """
+    runtime switches of payload logging
+    :full: log whole payload, for debugging
+    :maxLength: truncate payload longer than it
+    :every: log one of every N records per category, 1 for all
+    """
+    def __init__(self) -> None:
+        self.full = False
+        self.maxLength = 300
+        self.every: dict[str, int] = {}
+        self._counts: dict[str, int] = {}
+
+    def sample(self, category: str) -> bool:
+        every = self.every.get(category, 1)
+        if every <= 1:
+            return True
+        cnt = self._counts.get(category, 0)
+        self._counts[category] = (cnt + 1) % every
+        return cnt == 0
+
+
+payloadLog = PayloadLog()
+
+
+def setPayloadLogging(
+    full: Optional[bool] = None,
+    maxLength: Optional[int] = None,
+    **every: int,
+) -> None:
+    """
+    e.g. setPayloadLogging(full=True) or setPayloadLogging(recv=100)
+    :every: category=N, log one of N records of category
+    """
+    if full is not None: payloadLog.full = full
+    if maxLength is not None: payloadLog.maxLength = maxLength
+    payloadLog.every.update(every)
+
+
+class Payload:
+    """
+    format data only when the record is emitted
+    """
+    __slots__ = ('data', )
+
+    def __init__(self, data: Any) -> None:
+        self.data = data
+
+    def __str__(self) -> str:
+        data = self.data
+        if not isinstance(data, str):
+            try:
+                data = json.dumps(data, ensure_ascii=False)
+            except (TypeError, ValueError):
+                data = repr(data)
+        if payloadLog.full or len(data) <= payloadLog.maxLength:
+            return data
+        return f"{data[:payloadLog.maxLength]}...({len(data)} chars)"
+
+    __repr__ = __str__
+
+
+def logPayload(
+    logger: logging.Logger,
+    level: int,
+    category: str,
+    msg: str,
+    *args: Any,
+) -> None:
+    """
+    log msg % args with `category` in record, if enabled and sampled
+    wrap payload args with `Payload`
+    """
+    if logger.isEnabledFor(level) and payloadLog.sample(category):
+        logger.log(level, msg, *args, extra={'category': category})
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    keep record unformatted, so formatting runs in listener thread
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def useQueueLogging(name: Optional[str] = None) -> QueueListener:
+    """
+    move handlers of logger `name` (root by default) to a background thread
+    :return: started listener, stopped at exit
+    """
+    logger = logging.getLogger(name)
+    handlers = logger.handlers[:]
+    q: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(LazyQueueHandler(q))  # type: ignore
+    listener = QueueListener(q, *handlers, respect_handler_level=True)  # type: ignore
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
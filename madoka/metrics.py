@@ -0,0 +1,306 @@
+"""
+counters and latency histograms of madoka
+disabled by default, call `registry.enable()` before starting the bot
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from bisect import bisect_left
+from typing import Any, Callable, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+Labels = tuple[str, ...]
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metric:
+    type = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+    def _labels(self, labels: Labels, extra: str = '') -> str:
+        pairs = [f'{k}="{_escape(str(v))}"' for k, v in zip(self.labelnames, labels)]
+        if extra: pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def snapshot(self) -> Any:
+        raise NotImplementedError
+
+    def prometheus(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, *labels: str, value: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._labels(k)} {v}" for k, v in self._values.items()]
+
+    def snapshot(self) -> dict[str, float]:
+        return {','.join(k): v for k, v in self._values.items()}
+
+
+class Gauge(Metric):
+    """
+    value is set directly, or read from a function at export
+    """
+    type = 'gauge'
+
+    def __init__(self, name: str, help: str, labelnames: Labels = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[Labels, Union[float, Callable[[], float]]] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self._values[labels] = value
+
+    def setFunction(self, func: Callable[[], float], *labels: str) -> None:
+        self._values[labels] = func
+
+    def remove(self, *labels: str) -> None:
+        self._values.pop(labels, None)
+
+    def get(self, *labels: str) -> float:
+        value = self._values.get(labels, 0)
+        return value() if callable(value) else value
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._labels(k)} {self.get(*k)}" for k in self._values]
+
+    def snapshot(self) -> dict[str, float]:
+        return {','.join(k): self.get(*k) for k in self._values}
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        # per labels: [count of each bucket..., count of +Inf, sum]
+        self._values: dict[Labels, list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        data = self._values.get(labels)
+        if data is None:
+            data = self._values[labels] = [0] * (len(self.buckets) + 2)
+        data[bisect_left(self.buckets, value)] += 1
+        data[-1] += value
+
+    def count(self, *labels: str) -> int:
+        data = self._values.get(labels)
+        return int(sum(data[:-1])) if data else 0
+
+    def samples(self) -> list[str]:
+        lines = []
+        for k, data in self._values.items():
+            acc = 0
+            for le, cnt in zip((*self.buckets, '+Inf'), data):
+                acc += cnt
+                bucket = self._labels(k, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket} {acc}")
+            lines.append(f"{self.name}_sum{self._labels(k)} {data[-1]}")
+            lines.append(f"{self.name}_count{self._labels(k)} {acc}")
+        return lines
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        ret = {}
+        for k, data in self._values.items():
+            count = sum(data[:-1])
+            ret[','.join(k)] = {
+                'count': count,
+                'sum': data[-1],
+                'avg': data[-1] / count if count else 0.0,
+            }
+        return ret
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.enabled = False
+        self._metrics: dict[str, Metric] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def _add(self, metric: Metric) -> Any:
+        assert metric.name not in self._metrics, f"duplicate metric {metric.name}"
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Labels = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Labels = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def prometheus(self) -> str:
+        return '\n'.join(metric.prometheus() for metric in self._metrics.values()) + '\n'
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 9100) -> asyncio.AbstractServer:
+        """
+        tiny http endpoint, `/json` for snapshot, otherwise prometheus text
+        """
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                request = await reader.readline()
+                while (await reader.readline()).strip():
+                    pass
+                path = request.split()[1].decode() if request.count(b' ') >= 2 else '/'
+                if path.startswith('/json'):
+                    body = json.dumps(self.snapshot()).encode()
+                    ctype = 'application/json'
+                else:
+                    body = self.prometheus().encode()
+                    ctype = 'text/plain; version=0.0.4'
+                writer.write(b'HTTP/1.1 200 OK\r\n'
+                             b'Content-Type: ' + ctype.encode() + b'\r\n'
+                             b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                             b'Connection: close\r\n\r\n' + body)
+                await writer.drain()
+            except:
+                logger.exception("metrics endpoint")
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        logger.info(f"metrics endpoint: http://{host}:{port}/metrics")
+        return server
+
+
+registry = Registry()
+
+messages = registry.counter(
+    'madoka_messages_total',
+    'Received messages',
+    ('type', ),
+)
+duplicates = registry.counter(
+    'madoka_duplicates_total',
+    'Replayed messages dropped before parsing',
+)
+flooded = registry.counter(
+    'madoka_flooded_total',
+    'Messages dropped or deferred by flood control',
+    ('action', ),
+)
+events = registry.counter(
+    'madoka_events_total',
+    'Received events',
+    ('type', ),
+)
+handlerSeconds = registry.histogram(
+    'madoka_handler_seconds',
+    'Handler running time',
+    ('handler', ),
+)
+handlerErrors = registry.counter(
+    'madoka_handler_errors_total',
+    'Handler raised exceptions',
+    ('handler', ),
+)
+handlerTimeouts = registry.counter(
+    'madoka_handler_timeouts_total',
+    'Handler cancelled by timeout or message budget',
+    ('handler', ),
+)
+filterRejections = registry.counter(
+    'madoka_filter_rejections_total',
+    'Messages rejected by the censor of a handler',
+    ('handler', ),
+)
+apiSeconds = registry.histogram(
+    'madoka_api_seconds',
+    'Round trip time of API command',
+    ('command', ),
+)
+futures = registry.gauge(
+    'madoka_futures_inflight',
+    'API commands waiting for response',
+    ('qid', ),
+)
+scheduleLag = registry.histogram(
+    'madoka_schedule_lag_seconds',
+    'Delay between planned and actual run of timed task',
+)
+scheduleRuns = registry.counter(
+    'madoka_schedule_runs_total',
+    'Timed task runs',
+    ('task', ),
+)
+tasks = registry.gauge(
+    'madoka_asyncio_tasks',
+    'Running asyncio tasks',
+)
+tasks.setFunction(lambda: len(asyncio.all_tasks()) if _loopRunning() else 0)
+
+
+def _loopRunning() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
@@ -0,0 +1,111 @@
+"""
+capture cProfile of the running event loop, and optional tracemalloc diff
+use `capture` directly, or `QQbot.enableProfileCommand` for admin chat
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_running = False
+
+
+class ProfileResult:
+    def __init__(
+        self,
+        seconds: float,
+        hot: list[str],
+        memory: list[str],
+        path: Optional[str],
+    ) -> None:
+        self.seconds = seconds
+        # hot functions by own time, then allocation sites by size diff
+        self.hot = hot
+        self.memory = memory
+        # full profile, read it by `pstats` or snakeviz
+        self.path = path
+
+    def __repr__(self) -> str:
+        return f"ProfileResult({self.seconds}s, path={self.path})"
+
+    def format(self) -> str:
+        lines = [f"profile {self.seconds}s, saved to {self.path}", *self.hot]
+        if self.memory:
+            lines += ["allocations:", *self.memory]
+        return '\n'.join(lines)
+
+
+def hotFunctions(stats: pstats.Stats, top: int = 20) -> list[str]:
+    rows = sorted(
+        stats.stats.items(),  # type: ignore
+        key=lambda item: item[1][2],
+        reverse=True,
+    )
+    lines = []
+    for (file, line, name), (_, ncalls, tottime, cumtime, _) in rows[:top]:
+        where = name if file == '~' else f"{os.path.basename(file)}:{line}({name})"
+        lines.append(f"{tottime * 1e3:9.1f}ms {cumtime * 1e3:9.1f}ms {ncalls:>8} {where}")
+    return lines
+
+
+def _save(profiler: cProfile.Profile, memory: list[str], path: str) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    profiler.dump_stats(path)
+    if memory:
+        with open(path + '.memory.txt', 'w') as fp:
+            fp.write('\n'.join(memory) + '\n')
+
+
+async def capture(
+    seconds: float = 10,
+    memory: bool = False,
+    top: int = 20,
+    directory: Optional[str] = 'profiles',
+) -> ProfileResult:
+    """
+    profile everything running in the event loop thread for seconds
+    :memory: also diff tracemalloc snapshots, slow down while capturing
+    :directory: where the full profile is saved, None to not save
+    """
+    global _running
+    if _running:
+        raise RuntimeError("profile capture is already running")
+    _running = True
+    tracing = tracemalloc.is_tracing()
+    try:
+        if memory and not tracing: tracemalloc.start()
+        before = tracemalloc.take_snapshot() if memory else None
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+
+        memoryLines: list[str] = []
+        if before is not None:
+            after = tracemalloc.take_snapshot()
+            memoryLines = [str(diff) for diff in after.compare_to(before, 'lineno')[:top]]
+
+        path = None
+        if directory is not None:
+            path = os.path.join(directory, time.strftime('madoka-%Y%m%d-%H%M%S.prof'))
+            await asyncio.get_running_loop().run_in_executor(
+                None, _save, profiler, memoryLines, path)
+            logger.info(f"profile saved to {path}")
+
+        hot = hotFunctions(pstats.Stats(profiler), top)
+        return ProfileResult(seconds, hot, memoryLines, path)
+    finally:
+        # only stop tracing started by us
+        if memory and not tracing: tracemalloc.stop()
+        _running = False
@@ -0,0 +1,161 @@
+"""
+trace an incoming message through parse, censors, handlers and sends
+disabled by default, call `tracer.enable(...)` before starting the bot
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'attrs', 'start', 'end')
+
+    def __init__(self, trace: Trace, name: str, attrs: dict[str, Any]) -> None:
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def __enter__(self) -> Span:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.finish()
+        return False
+
+    def finish(self, *_: Any) -> None:
+        """
+        accept and ignore args, so it can be a done callback
+        """
+        if self.end is not None: return
+        self.end = time.perf_counter()
+        self.trace._close()
+
+    def dict(self) -> dict[str, Any]:
+        return {
+            'name': self.name,
+            'start': round((self.start - self.trace.start) * 1e3, 3),
+            'duration': round(((self.end or self.start) - self.start) * 1e3, 3),
+            **self.attrs,
+        }
+
+
+class Trace:
+    def __init__(self, tracer: Tracer, sampled: bool, **attrs: Any) -> None:
+        self.tracer = tracer
+        self.id = os.urandom(8).hex()
+        self.sampled = sampled
+        self.attrs = attrs
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.spans: list[Span] = []
+        self._open = 0
+        self._handled = False
+
+    def span(self, name: str, **attrs: Any) -> Span:
+        """
+        use as context manager, or call `finish` when done
+        """
+        span = Span(self, name, attrs)
+        self.spans.append(span)
+        self._open += 1
+        return span
+
+    def _close(self) -> None:
+        self._open -= 1
+        if self._handled and self._open == 0:
+            self._finish()
+
+    def handled(self) -> None:
+        """
+        all handlers are done, finish when open spans (e.g. sends) are done
+        """
+        self._handled = True
+        if self._open == 0:
+            self._finish()
+
+    def _finish(self) -> None:
+        if self.end is not None: return
+        self.end = time.perf_counter()
+        self.tracer.export(self)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def dict(self) -> dict[str, Any]:
+        return {
+            'traceId': self.id,
+            'time': self.wall,
+            'duration': round(self.duration * 1e3, 3),
+            **self.attrs,
+            'spans': [span.dict() for span in self.spans],
+        }
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.rate = 0.0
+        self.slow: Optional[float] = None
+        self.path: Optional[str] = None
+        self.exported = 0
+        self._fp: Any = None
+
+    def enable(
+        self,
+        rate: float = 0.01,
+        slow: Optional[float] = 1.0,
+        path: Optional[str] = 'madoka-trace.jsonl',
+    ) -> None:
+        """
+        :rate: fraction of traces exported
+        :slow: seconds, traces slower than it are always exported
+        :path: JSON lines output, None to only log at debug level
+        """
+        self.rate = rate
+        self.slow = slow
+        if path != self.path and self._fp:
+            self._fp.close()
+            self._fp = None
+        self.path = path
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        if self._fp:
+            self._fp.close()
+            self._fp = None
+
+    def start(self, **attrs: Any) -> Optional[Trace]:
+        if not self.enabled: return None
+        return Trace(self, random.random() < self.rate, **attrs)
+
+    def export(self, trace: Trace) -> None:
+        if not (trace.sampled or self.slow is not None and trace.duration >= self.slow):
+            return
+        self.exported += 1
+        line = json.dumps(trace.dict(), ensure_ascii=False)
+        if self.path is None:
+            logger.debug(line)
+            return
+        if self._fp is None:
+            self._fp = open(self.path, 'a', buffering=1)
+        self._fp.write(line + '\n')
+
+
+tracer = Tracer()
+
+traceStore: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
@@ -1,3 +1,4 @@
+from .chain import *
 from .context import *
 from .event import *
 from .sender import *
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Iterable, Iterator, Optional, Union
+
+from .text import ForwardMessageNode, ForwardMessageNodeById, Text
+
+__all__ = ['Chain', 'segment']
+
+_templates: dict[str, dict[str, Any]] = {}
+
+
+def segment(type: str, **kwargs: Any) -> dict[str, Any]:
+    """
+    build the wire dict of a Text without validation
+    keys come from the fields of the Text subclass registered for `type`
+    """
+    template = _templates.get(type)
+    if template is None:
+        ins_cls = Text.TypeMap.types.get(type)
+        if ins_cls is None:
+            raise ValueError(f"Unknown Text type: {type}")
+        template = {name: None for name in ins_cls.__fields__}
+        template['type'] = type
+        _templates[type] = template
+    if not kwargs.keys() <= template.keys():
+        unknown = ', '.join(kwargs.keys() - template.keys())
+        raise ValueError(f"Unknown field for {type}: {unknown}")
+    seg = template.copy()
+    seg.update(kwargs)
+    return seg
+
+
+class Chain:
+    """
+    lightweight builder of outgoing messageChain
+    produce the same dicts as `Text.dict()`, but skip pydantic
+    """
+
+    __slots__ = ('_chain', )
+
+    def __init__(self, message: Optional[Union[str, Text, Iterable[Text]]] = None) -> None:
+        self._chain: list[dict[str, Any]] = []
+        if message is not None:
+            self.extend(message)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        return iter(self._chain)
+
+    def __len__(self) -> int:
+        return len(self._chain)
+
+    def __repr__(self) -> str:
+        return f"Chain({self._chain!r})"
+
+    def add(self, type: str, **kwargs: Any) -> Chain:
+        self._chain.append(segment(type, **kwargs))
+        return self
+
+    def extend(self, message: Union[str, Text, Chain, Iterable[Text]]) -> Chain:
+        if isinstance(message, str):
+            self.text(message)
+        elif isinstance(message, Text):
+            self._chain.append(message.dict())
+        elif isinstance(message, Chain):
+            self._chain.extend(message._chain)
+        else:
+            self._chain.extend(text.dict() for text in message)
+        return self
+
+    def text(self, text: str) -> Chain:
+        return self.add('Plain', text=text)
+
+    def at(self, target: int, display: str = '') -> Chain:
+        return self.add('At', target=target, display=display)
+
+    def atAll(self) -> Chain:
+        return self.add('AtAll', target=0)
+
+    def face(self, faceId: Optional[int] = None, name: Optional[str] = None) -> Chain:
+        return self.add('Face', faceId=faceId, name=name)
+
+    def image(
+        self,
+        path: Optional[str] = None,
+        url: Optional[str] = None,
+        imageId: Optional[str] = None,
+        base64: Optional[str] = None,
+    ) -> Chain:
+        """
+        :path: Need to be a relative path
+        """
+        return self.add(
+            'Image',
+            imageId=imageId,
+            url=url,
+            path=path,
+            base64=base64,
+        )
+
+    def flashImage(
+        self,
+        path: Optional[str] = None,
+        url: Optional[str] = None,
+        imageId: Optional[str] = None,
+        base64: Optional[str] = None,
+    ) -> Chain:
+        return self.add(
+            'FlashImage',
+            imageId=imageId,
+            url=url,
+            path=path,
+            base64=base64,
+        )
+
+    def forward(
+        self,
+        nodeList: Iterable[Union[dict[str, Any], ForwardMessageNode,
+                                 ForwardMessageNodeById, int]],
+    ) -> Chain:
+        """
+        :nodeList: node dict, node model, or messageId
+        """
+        nodes: list[dict[str, Any]] = []
+        for node in nodeList:
+            if isinstance(node, int):
+                nodes.append({'messageId': node})
+            elif isinstance(node, dict):
+                nodes.append(node)
+            else:
+                nodes.append(node.dict())
+        return self.add('Forward', nodeList=nodes)
+
+    def build(self) -> list[dict[str, Any]]:
+        """
+        :return: messageChain in wire format, not copied
+        """
+        return self._chain
+
+    def json(self) -> str:
+        return json.dumps(self._chain)
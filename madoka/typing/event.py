@@ -1,8 +1,12 @@
 from __future__ import annotations
 
-from typing import Literal, Type, get_args, get_origin
+from typing import Literal, Optional, Type, get_args, get_origin
 
-from pydantic import BaseModel  # pylint: disable=no-name-in-module
+from pydantic import BaseModel, Field  # pylint: disable=no-name-in-module
+
+from .sender import FriendSender, GroupInfo, GroupSender
+
+Permission = Literal['OWNER', 'ADMINISTRATOR', 'MEMBER']
 
 
 class Event(BaseModel, extra='forbid'):
@@ -80,4 +84,104 @@ class BotReloginEvent(Event):
     qq: int
 
 
+class FriendInputStatusChangedEvent(Event):
+    type: Literal['FriendInputStatusChangedEvent']
+    friend: FriendSender
+    inputting: bool
+
+
+class FriendNickChangedEvent(Event):
+    type: Literal['FriendNickChangedEvent']
+    friend: FriendSender
+    origin: str = Field(alias='from')
+    current: str = Field(alias='to')
+
+
+class FriendAddEvent(Event):
+    type: Literal['FriendAddEvent']
+    friend: FriendSender
+    stranger: bool
+
+
+class FriendDeleteEvent(Event):
+    type: Literal['FriendDeleteEvent']
+    friend: FriendSender
+
+
+class BotGroupPermissionChangeEvent(Event):
+    type: Literal['BotGroupPermissionChangeEvent']
+    origin: Permission
+    current: Permission
+    group: GroupInfo
+
+
+class BotJoinGroupEvent(Event):
+    type: Literal['BotJoinGroupEvent']
+    group: GroupInfo
+    invitor: Optional[GroupSender]
+
+
+class BotLeaveEventActive(Event):
+    type: Literal['BotLeaveEventActive']
+    group: GroupInfo
+
+
+class BotLeaveEventKick(Event):
+    type: Literal['BotLeaveEventKick']
+    group: GroupInfo
+    operator: Optional[GroupSender]
+
+
+class BotLeaveEventDisband(Event):
+    type: Literal['BotLeaveEventDisband']
+    group: GroupInfo
+    operator: Optional[GroupSender]
+
+
+class GroupNameChangeEvent(Event):
+    type: Literal['GroupNameChangeEvent']
+    origin: str
+    current: str
+    group: GroupInfo
+    operator: Optional[GroupSender]
+
+
+class MemberJoinEvent(Event):
+    type: Literal['MemberJoinEvent']
+    member: GroupSender
+    invitor: Optional[GroupSender]
+
+
+class MemberLeaveEventKick(Event):
+    type: Literal['MemberLeaveEventKick']
+    member: GroupSender
+    operator: Optional[GroupSender]
+
+
+class MemberLeaveEventQuit(Event):
+    type: Literal['MemberLeaveEventQuit']
+    member: GroupSender
+
+
+class MemberCardChangeEvent(Event):
+    type: Literal['MemberCardChangeEvent']
+    origin: str
+    current: str
+    member: GroupSender
+
+
+class MemberSpecialTitleChangeEvent(Event):
+    type: Literal['MemberSpecialTitleChangeEvent']
+    origin: str
+    current: str
+    member: GroupSender
+
+
+class MemberPermissionChangeEvent(Event):
+    type: Literal['MemberPermissionChangeEvent']
+    origin: Permission
+    current: Permission
+    member: GroupSender
+
+
 # TODO more Event and resp
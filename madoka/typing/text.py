@@ -165,9 +165,10 @@ class ForwardMessageText(Text):
         nodeList: list[ForwardMessageNode | ForwardMessageNodeById | int],
         type: Literal['Forward'] = 'Forward',
     ) -> None:
-        for i, node in enumerate(nodeList):
-            if isinstance(node, int):
-                nodeList[i] = ForwardMessageNodeById(messageId=node)
+        nodeList = [
+            ForwardMessageNodeById(messageId=node)
+            if isinstance(node, int) else node for node in nodeList
+        ]
         super().__init__(nodeList=nodeList, type=type)
 
     def iterNode(self) -> list[ForwardMessageNode]:
@@ -15,9 +15,11 @@ setup(
         'websockets>=8.1',
         'pydantic>=1.8',
         'croniter>=1.0',
-        'cachetools>=4.2',
+        'cachetools>=5.3',
     ],
-    extras_require={},
+    extras_require={
+        'http': ['aiohttp>=3.7'],
+    },
     # description
     description="A bot framework based on mirai-api-http",
     long_description=long_description,